@@ -0,0 +1,122 @@
+import sys
+import os
+import re
+import json
+import time
+import zlib
+import uuid
+import asyncio
+import random
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# ==========================
+# Stand-ins for the LLM and the embedding model, so that benchmarks run offline and deterministically
+# ==========================
+class FakeChatModel(BaseChatModel):
+    '''
+    Deterministic chat model with a configurable latency: the first token arrives after `latency` seconds and
+    the following ones at `tokens_per_second`.
+    When tools are bound it calls the retrieval tool with the last user question, as the router would.'''
+    latency: float = 0.3 # Seconds before the first token
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 60 # Tokens of every answer
+
+    @property
+    def _llm_type(self):
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _tool_call(self, messages, tools):
+        """AIMessage calling the first bound tool, if the model is routing a new user question."""
+        if not tools or messages[-1].type != "human":
+            return None
+        tool_call = {"name": tools[0]["function"]["name"], "args": {"query": messages[-1].content},
+                     "id": f"call_{uuid.uuid4().hex}", "type": "tool_call"}
+        return AIMessage(content="", tool_calls=[tool_call])
+
+    @staticmethod
+    def _tool_call_chunk(message):
+        return ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+            for i, call in enumerate(message.tool_calls)
+        ]))
+
+    def _answer_tokens(self, messages):
+        # The answer depends only on the prompt, so that runs are comparable
+        words = re.findall(r"\w+", str(messages[-1].content).lower()) or ["answer"]
+        rng = random.Random(zlib.crc32(str(messages[-1].content).encode("utf-8")))
+        return [rng.choice(words) + " " for _ in range(self.answer_tokens)]
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        message = self._tool_call(messages, tools)
+        if message is None:
+            tokens = self._answer_tokens(messages)
+            time.sleep(self.latency + (len(tokens) - 1) / self.tokens_per_second)
+            message = AIMessage(content="".join(tokens))
+        else:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        message = self._tool_call(messages, tools)
+        if message is None:
+            tokens = self._answer_tokens(messages)
+            await asyncio.sleep(self.latency + (len(tokens) - 1) / self.tokens_per_second)
+            message = AIMessage(content="".join(tokens))
+        else:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        message = self._tool_call(messages, tools)
+        time.sleep(self.latency)
+        if message is not None:
+            yield self._tool_call_chunk(message)
+            return
+        for i, token in enumerate(self._answer_tokens(messages)):
+            if i:
+                time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        message = self._tool_call(messages, tools)
+        await asyncio.sleep(self.latency)
+        if message is not None:
+            yield self._tool_call_chunk(message)
+            return
+        for i, token in enumerate(self._answer_tokens(messages)):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+class HashingEmbeddings(Embeddings):
+    '''
+    Bag-of-words embeddings with the hashing trick: texts sharing words get similar normalized vectors.
+    Costs microseconds per text and needs no model download.'''
+
+    def __init__(self, dimension=256):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = zlib.crc32(word.encode("utf-8"))
+            vector[digest % self.dimension] += 1.0 if digest & 1 << 31 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
@@ -0,0 +1,97 @@
+import sys
+import os
+import json
+import time
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import faiss
+import numpy as np
+from pathlib import Path
+from config import Config as cfg
+from core.faiss_index import index_params_from_config, build_index, configure_search, reconstruct_vectors
+
+# Search-time settings evaluated for each index type (build parameters come from Config)
+SETTINGS = {
+    "flat": [{}],
+    "ivf_flat": [{"nprobe": 1}, {"nprobe": 4}, {"nprobe": 16}, {"nprobe": 64}],
+    "hnsw": [{"ef_search": 16}, {"ef_search": 32}, {"ef_search": 64}, {"ef_search": 128}],
+    "ivf_pq": [{"nprobe": 4}, {"nprobe": 16}, {"nprobe": 64}],
+}
+
+def load_queries(args, vectors):
+    """Embed the queries of the query file, or perturb a random sample of the indexed vectors."""
+    if args.query_file:
+        from core.vector_store import VectorStoreManager
+        with open(args.query_file, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+        embeddings = VectorStoreManager().embeddings
+        return np.array([embeddings.embed_query(query) for query in queries], dtype=np.float32)
+
+    rng = np.random.default_rng(args.seed)
+    sample = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = sample + rng.normal(scale=args.noise, size=sample.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def measure(index, queries, ground_truth, k):
+    """Return recall@k against the ground truth and the latency percentiles of single-query searches."""
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, ground_truth):
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(ids[0]) & set(expected))
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@TOP_K and latency of the FAISS index types against the flat index.")
+    parser.add_argument("--vector-store", default=cfg.VECTOR_STORE_PATH, help="Vector store to benchmark")
+    parser.add_argument("--query-file", help="Text file with one query per line (embedded with the configured model)")
+    parser.add_argument("--queries", type=int, default=500, help="Number of sampled queries when no query file is given")
+    parser.add_argument("--noise", type=float, default=0.02, help="Noise added to the sampled query vectors")
+    parser.add_argument("--types", nargs="+", default=list(SETTINGS), choices=list(SETTINGS))
+    parser.add_argument("--k", type=int, default=cfg.TOP_K)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save the results as JSON")
+    args = parser.parse_args()
+
+    flat = faiss.read_index(str(Path(args.vector_store) / "index.faiss"))
+    vectors = reconstruct_vectors(flat)
+    queries = load_queries(args, vectors)
+    _, ground_truth = flat.search(queries, args.k)
+    print(f"{flat.ntotal} vectors of dimension {flat.d}, {len(queries)} queries, k={args.k}\n")
+
+    _, config_params = index_params_from_config()
+    results = []
+    print(f"{'index':<10} {'setting':<18} {'build (s)':>10} {'recall@k':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for index_type in args.types:
+        start = time.perf_counter()
+        try:
+            index = build_index(vectors, index_type, config_params)
+        except ValueError as e:
+            print(f"{index_type:<10} skipped: {e}")
+            continue
+        build_time = time.perf_counter() - start
+        for setting in SETTINGS[index_type]:
+            params = {**config_params, **setting}
+            configure_search(index, params)
+            result = {"index_type": index_type, "setting": setting, "build_s": build_time,
+                      **measure(index, queries, ground_truth, args.k)}
+            results.append(result)
+            label = ", ".join(f"{key}={value}" for key, value in setting.items()) or "exact"
+            print(f"{index_type:<10} {label:<18} {build_time:>10.2f} {result['recall_at_k']:>9.3f} "
+                  f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"ntotal": flat.ntotal, "queries": len(queries), "k": args.k, "results": results}, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
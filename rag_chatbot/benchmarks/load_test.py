@@ -0,0 +1,176 @@
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from pathlib import Path
+from config import Config as cfg
+from benchmarks.offline_benchmark import QUESTIONS, configure_offline, generate_corpus, summarize
+
+# ==========================
+# Offline server
+# ==========================
+def serve_offline(args):
+    """Run the HTTP server on a synthetic corpus with the fake LLM and the hashing embeddings."""
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag_load_test_"))
+    configure_offline(workdir, args.dimension)
+    cfg.SEMANTIC_CACHE = False
+
+    from benchmarks.fakes import FakeChatModel, HashingEmbeddings
+    from core.vector_store import VectorStoreManager
+    # The manager is a singleton: create it with the fake embeddings before the graph module does
+    VectorStoreManager(embeddings=HashingEmbeddings(args.dimension))
+    from core.chat_graph import ChatGraph
+    from services import http_server
+
+    try:
+        generate_corpus(cfg.DOCUMENTS_PATH, args.pages, args.lines, args.seed)
+        # The graph shared by the sessions of the server, created before the session manager asks for it
+        ChatGraph._shared = ChatGraph(llm_client=FakeChatModel(
+            latency=args.latency, tokens_per_second=args.tokens_per_second, answer_tokens=args.answer_tokens
+        ))
+        http_server.run(args.host, args.port)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def start_server(args):
+    """Start the offline server in a subprocess and return it with the seconds until it reported ready."""
+    command = [sys.executable, os.path.abspath(__file__), "--serve-offline", "--host", args.host, "--port", str(args.port)]
+    for option in ("pages", "lines", "dimension", "latency", "tokens_per_second", "answer_tokens", "seed"):
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL if not args.verbose else None)
+    url = f"http://{args.host}:{args.port}/readyz"
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return process, time.perf_counter() - start
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+
+# ==========================
+# Load generation
+# ==========================
+async def user(client, deadline, stream_fraction, rng, results):
+    """One simulated user: a session asking the course questions until the deadline, streaming some of the answers."""
+    response = await client.post("/sessions")
+    if response.status_code != 201:
+        results["status"][response.status_code] = results["status"].get(response.status_code, 0) + 1
+        return
+    session_id = response.json()["session_id"]
+    questions = list(QUESTIONS)
+    rng.shuffle(questions)
+    turn = 0
+    while time.perf_counter() < deadline:
+        question = questions[turn % len(questions)]
+        turn += 1
+        start = time.perf_counter()
+        if rng.random() < stream_fraction:
+            first_token = None
+            async with client.stream("POST", f"/sessions/{session_id}/stream", json={"message": question}) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if first_token is None and line == "event: token":
+                        first_token = time.perf_counter() - start
+            if status == 200 and first_token is not None:
+                results["ttft"].append(first_token)
+        else:
+            response = await client.post(f"/sessions/{session_id}/messages", json={"message": question})
+            status = response.status_code
+        results["status"][status] = results["status"].get(status, 0) + 1
+        if status == 200:
+            results["latency"].append(time.perf_counter() - start)
+        elif status == 503:
+            # Back off as the server asks, like a well-behaved client
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+    await client.delete(f"/sessions/{session_id}")
+
+async def run_load(url, users, duration, stream_fraction, seed):
+    results = {"latency": [], "ttft": [], "status": {}}
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            user(client, deadline, stream_fraction, random.Random(seed + i), results) for i in range(users)
+        ))
+        elapsed = time.perf_counter() - start
+        metrics = (await client.get("/metrics")).text
+    return results, elapsed, metrics
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test of the HTTP server: concurrent users asking the course questions for a fixed duration."
+    )
+    parser.add_argument("--url", help="Base URL of a running server (default: the --host and --port)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=cfg.HTTP_PORT)
+    parser.add_argument("--start-server", action="store_true", help="Start an offline server and measure its warm-up")
+    parser.add_argument("--serve-offline", action="store_true", help="Only run an offline server with the fake LLM")
+    parser.add_argument("--users", type=int, default=16, help="Concurrent users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--stream-fraction", type=float, default=0.5, help="Fraction of the answers that are streamed")
+    parser.add_argument("--workdir", help="Directory of the corpus and the vector store of the offline server")
+    parser.add_argument("--pages", type=int, default=20, help="Content pages per slide deck")
+    parser.add_argument("--lines", type=int, default=30, help="Lines per page")
+    parser.add_argument("--dimension", type=int, default=256, help="Dimension of the hashing embeddings")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds before the first token of the fake LLM")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Token rate of the fake LLM")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="Tokens of every fake answer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the started server")
+    parser.add_argument("--output", help="Save the results as JSON")
+    args = parser.parse_args()
+
+    if args.serve_offline:
+        serve_offline(args)
+        return
+
+    process, warmup_s = None, None
+    if args.start_server:
+        process, warmup_s = start_server(args)
+        print(f"Server ready in {warmup_s:.2f}s")
+    try:
+        url = args.url or f"http://{args.host}:{args.port}"
+        samples, elapsed, metrics = asyncio.run(run_load(url, args.users, args.duration, args.stream_fraction, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "serve_offline", "verbose")},
+        "ready_s": warmup_s,
+        "throughput_rps": len(samples["latency"]) / elapsed,
+        "latency": summarize(samples["latency"]) if samples["latency"] else None,
+        "time_to_first_token": summarize(samples["ttft"]) if samples["ttft"] else None,
+        "status": {str(status): count for status, count in sorted(samples["status"].items())},
+        "rejected": samples["status"].get(503, 0) + samples["status"].get(409, 0),
+        "metrics": metrics,
+    }
+
+    for name in ("latency", "time_to_first_token"):
+        if results[name]:
+            print(f"{name:<20} p50 {results[name]['p50_ms']:>9.1f} ms   p99 {results[name]['p99_ms']:>9.1f} ms")
+    print(f"{'throughput':<20} {results['throughput_rps']:.2f} answers/s with {args.users} users")
+    print(f"{'status codes':<20} {results['status']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
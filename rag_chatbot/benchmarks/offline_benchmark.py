@@ -0,0 +1,305 @@
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from pathlib import Path
+from config import Config as cfg
+
+# Course questions replayed in every run, in this order
+QUESTIONS = [
+    "Hello!",
+    "Who is the professor of the course?",
+    "How is the exam organised?",
+    "What is a transformer?",
+    "How does self-attention work?",
+    "What is the difference between BERT and GPT?",
+    "What is tokenization?",
+    "Explain byte pair encoding.",
+    "What are word embeddings?",
+    "How does word2vec learn word vectors?",
+    "What is fine-tuning of a language model?",
+    "What is retrieval augmented generation?",
+    "How does beam search decoding work?",
+    "What is perplexity?",
+    "What is instruction tuning?",
+    "What is reinforcement learning from human feedback?",
+    "How are positional encodings computed?",
+    "What is prompt engineering?",
+    "Thanks!",
+]
+
+# Topics of the synthetic corpus: each one becomes a slide deck mentioning its key terms
+TOPICS = {
+    "Course organisation": ["course", "professor", "exam", "project", "lectures", "credits", "lab", "grade"],
+    "Tokenization": ["tokenization", "byte", "pair", "encoding", "subword", "vocabulary", "merges", "tokens"],
+    "Word embeddings": ["word", "embeddings", "word2vec", "skip", "gram", "vectors", "similarity", "context"],
+    "Transformers": ["transformer", "self", "attention", "queries", "keys", "values", "heads", "positional", "encodings"],
+    "BERT and GPT": ["bert", "gpt", "encoder", "decoder", "masked", "language", "model", "autoregressive"],
+    "Decoding": ["decoding", "beam", "search", "greedy", "sampling", "temperature", "perplexity", "probability"],
+    "Fine-tuning": ["fine", "tuning", "instruction", "reinforcement", "learning", "human", "feedback", "reward"],
+    "Retrieval augmented generation": ["retrieval", "augmented", "generation", "prompt", "engineering", "documents", "context", "vector"],
+}
+FILLER = ["the", "model", "is", "used", "to", "compute", "a", "representation", "of", "each", "input", "with",
+          "training", "data", "and", "in", "practice", "this", "improves", "results", "on", "benchmarks"]
+
+# ==========================
+# Synthetic corpus
+# ==========================
+def _pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path, pages, author="Benchmark"):
+    """Write a minimal PDF with one text line per list item, readable by pdfplumber."""
+    objects = [None, None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>", f"<< /Author ({_pdf_text(author)}) >>"]
+    page_ids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({_pdf_text(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {len(objects)} 0 R "
+                       "/Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(len(objects))
+    objects[0] = "<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info 4 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    Path(path).write_bytes(bytes(output))
+
+def generate_corpus(path, pages_per_deck, lines_per_page, seed):
+    """
+    Write one slide deck per topic, with deterministic sentences built from its key terms.
+    Like real slides, every page has a header and a numbered footer, every fifth page is short and every deck
+    repeats its outline slide.
+    """
+    rng = random.Random(seed)
+    Path(path).mkdir(parents=True, exist_ok=True)
+    for number, (topic, terms) in enumerate(TOPICS.items(), start=1):
+        pages = [[f"Natural Language Processing and Large Language Models - {topic}"]]
+        outline = [f"Outline: {', '.join(terms[:4])} and their use in language models."] * 3
+        for page in range(pages_per_deck):
+            lines = [f"{topic} ({page + 1})"]
+            if page % 10 in (0, 9):
+                lines += outline
+            else:
+                for _ in range(2 if page % 5 == 4 else lines_per_page):
+                    words = rng.choices(terms, k=4) + rng.choices(FILLER, k=8)
+                    rng.shuffle(words)
+                    lines.append(" ".join(words).capitalize() + ".")
+            pages.append(["NLP and LLM - University of Salerno"] + lines + [f"Slide {page + 2} / {pages_per_deck + 2}"])
+        pages.append(["Questions?"])
+        # Decks are named like the course slides, whose first and last pages are skipped
+        write_pdf(Path(path) / f"{number:02d}_{topic.lower().replace(' ', '_')}.pdf", pages)
+
+def configure_offline(workdir, dimension):
+    """
+    Point the configuration to a working directory, the hashing embeddings and in-memory conversations.
+    Must be called before the core modules are imported, since they read the configuration at import.
+    """
+    cfg.DOCUMENTS_PATH = str(Path(workdir) / "corpus")
+    cfg.VECTOR_STORE_PATH = str(Path(workdir) / "vector_store")
+    cfg.EMBEDDING_CACHE_PATH = str(Path(workdir) / "embedding_cache.sqlite")
+    cfg.HF_EMBEDDING_MODEL = f"hashing-{dimension}"
+    cfg.CHECKPOINTER = "memory"
+
+# ==========================
+# Measurements
+# ==========================
+def summarize(values):
+    """Percentiles in milliseconds of a list of durations in seconds."""
+    values = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+def measure_stream(service, question):
+    """Return the time to first token and the total time of a streamed answer."""
+    start = time.perf_counter()
+    first_token = None
+    for item in service.stream_message(question):
+        if first_token is None and item["type"] != "tool" and item["content"]:
+            first_token = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return first_token if first_token is not None else total, total
+
+async def run_sessions(graph, service_class, sessions, rounds):
+    """Replay the questions in `sessions` concurrent sessions and return the latencies and the elapsed time."""
+    latencies = []
+
+    async def session():
+        service = service_class(chat_graph=graph)
+        for _ in range(rounds):
+            for question in QUESTIONS:
+                start = time.perf_counter()
+                await service.asend_message(question)
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(sessions)))
+    return latencies, time.perf_counter() - start
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children (the PDF extraction workers)."""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 / 1024 / 1024 if sys.platform == "darwin" else 1 / 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+def compare(results, baseline):
+    """Print the main metrics of this run next to those of a previous run."""
+    metrics = [
+        ("index build (s)", ["index_build_s"]),
+        ("retrieval p50 (ms)", ["retrieval", "p50_ms"]),
+        ("retrieval p99 (ms)", ["retrieval", "p99_ms"]),
+        ("send p50 (ms)", ["send_message", "p50_ms"]),
+        ("ttft p50 (ms)", ["time_to_first_token", "p50_ms"]),
+        ("ttft p99 (ms)", ["time_to_first_token", "p99_ms"]),
+        ("throughput (q/s)", ["concurrency", "throughput_qps"]),
+        ("peak RSS (MB)", ["peak_rss_mb", "self"]),
+    ]
+    def lookup(values, keys):
+        for key in keys:
+            values = values.get(key) if isinstance(values, dict) else None
+        return values
+
+    print(f"\n{'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, keys in metrics:
+        old, new = lookup(baseline, keys), lookup(results, keys)
+        if isinstance(old, (int, float)) and old:
+            print(f"{name:<20} {old:>10.2f} {new:>10.2f} {(new - old) / old:>+8.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline end-to-end benchmark with a fake LLM, hashing embeddings and a synthetic PDF corpus."
+    )
+    parser.add_argument("--workdir", help="Directory of the corpus and the vector store (default: a temporary directory)")
+    parser.add_argument("--pages", type=int, default=20, help="Content pages per slide deck")
+    parser.add_argument("--lines", type=int, default=30, help="Lines per page")
+    parser.add_argument("--dimension", type=int, default=256, help="Dimension of the hashing embeddings")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds before the first token of the fake LLM")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Token rate of the fake LLM")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="Tokens of every fake answer")
+    parser.add_argument("--rounds", type=int, default=3, help="Replays of the question set per measurement")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions of the throughput measurement")
+    parser.add_argument("--semantic-cache", action="store_true", help="Keep the semantic answer cache enabled")
+    parser.add_argument("--routing-mode", choices=["local", "llm"], default=cfg.ROUTING_MODE)
+    parser.add_argument("--no-speculative", action="store_true", help="Disable speculative retrieval")
+    parser.add_argument("--plain-chunking", action="store_true", help="Split each page on its own, without layout-aware chunking")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag_benchmark_"))
+    # The configuration is read when the modules are imported, so it is overridden first
+    configure_offline(workdir, args.dimension)
+    cfg.SEMANTIC_CACHE = args.semantic_cache
+    cfg.ROUTING_MODE = args.routing_mode
+    cfg.SPECULATIVE_RETRIEVAL = not args.no_speculative
+    cfg.LAYOUT_AWARE_CHUNKING = not args.plain_chunking
+
+    from benchmarks.fakes import FakeChatModel, HashingEmbeddings
+    from core.vector_store import VectorStoreManager
+    # The manager is a singleton: create it with the fake embeddings before the graph module does
+    manager = VectorStoreManager(embeddings=HashingEmbeddings(args.dimension))
+    from core.chat_graph import ChatGraph
+    from core.telemetry import telemetry
+    from services.chatbot_service import ChatbotService
+
+    try:
+        generate_corpus(cfg.DOCUMENTS_PATH, args.pages, args.lines, args.seed)
+
+        start = time.perf_counter()
+        manager.get_vector_store()
+        index_build_s = time.perf_counter() - start
+        print(f"Index built in {index_build_s:.2f}s: {manager.vector_store.index.ntotal} chunks\n")
+
+        retrieval = []
+        for _ in range(args.rounds):
+            for question in QUESTIONS:
+                start = time.perf_counter()
+                manager.search(question)
+                retrieval.append(time.perf_counter() - start)
+
+        llm = FakeChatModel(latency=args.latency, tokens_per_second=args.tokens_per_second, answer_tokens=args.answer_tokens)
+        graph = ChatGraph(llm_client=llm)
+
+        send = []
+        for _ in range(args.rounds):
+            service = ChatbotService(chat_graph=graph)
+            for question in QUESTIONS:
+                start = time.perf_counter()
+                service.send_message(question)
+                send.append(time.perf_counter() - start)
+
+        first_tokens, streams = [], []
+        for _ in range(args.rounds):
+            service = ChatbotService(chat_graph=graph)
+            for question in QUESTIONS:
+                first_token, total = measure_stream(service, question)
+                first_tokens.append(first_token)
+                streams.append(total)
+
+        latencies, elapsed = asyncio.run(run_sessions(graph, ChatbotService, args.sessions, args.rounds))
+
+        results = {
+            "config": {
+                **{key: value for key, value in vars(args).items() if key not in ("output", "baseline", "workdir")},
+                **{key: getattr(cfg, key) for key in (
+                    "CHUNK_SIZE", "CHUNK_OVERLAP", "TOP_K", "FAISS_INDEX_TYPE", "RETRIEVAL_MODE", "RERANK", "ROUTING_MODE"
+                )},
+            },
+            "corpus": {"files": len(TOPICS), "chunks": int(manager.vector_store.index.ntotal), "questions": len(QUESTIONS)},
+            "index_build_s": index_build_s,
+            "retrieval": summarize(retrieval),
+            "send_message": summarize(send),
+            "time_to_first_token": summarize(first_tokens),
+            "stream_total": summarize(streams),
+            "concurrency": {
+                "sessions": args.sessions,
+                "throughput_qps": len(latencies) / elapsed,
+                **summarize(latencies),
+            },
+            "peak_rss_mb": peak_rss_mb(),
+            "telemetry": telemetry.snapshot(),
+        }
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for name in ("retrieval", "send_message", "time_to_first_token", "stream_total", "concurrency"):
+        print(f"{name:<20} p50 {results[name]['p50_ms']:>9.1f} ms   p99 {results[name]['p99_ms']:>9.1f} ms")
+    print(f"{'throughput':<20} {results['concurrency']['throughput_qps']:.2f} questions/s with {args.sessions} sessions")
+    print(f"{'peak RSS':<20} {results['peak_rss_mb']['self']:.0f} MB")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
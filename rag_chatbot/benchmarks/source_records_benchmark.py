@@ -0,0 +1,62 @@
+import sys
+import os
+import re
+import timeit
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.documents import Document
+from config import Config as cfg
+from core.sources import to_source_records, format_context
+
+def legacy_serialize(docs):
+    """Tool output format used before the structured artifacts."""
+    return "\n\n".join((f"Source: {doc.metadata}\nContent: {doc.page_content}") for doc in docs)
+
+def legacy_parse(text):
+    """Re-parsing of the tool output previously done by ChatbotService on every tool message."""
+    results = []
+    for entry in re.split(r'(?=Source: )', text.strip()):
+        if not entry.strip():
+            continue
+        source_match = re.search(r'Source: (\{.*?\})', entry)
+        content_match = re.search(r'Content: (.*?)(?=Source:|$)', entry, re.DOTALL)
+        if source_match and content_match:
+            try:
+                source_dict = eval(source_match.group(1))
+            except Exception:
+                source_dict = {"raw_source": source_match.group(1)}
+            results.append({"source": source_dict, "content": content_match.group(1).strip()})
+    return results
+
+def make_docs(k, chunk_size):
+    text = ("Attention lets every token look at every other token of the sequence. " * (chunk_size // 70 + 1))[:chunk_size]
+    return [
+        Document(
+            page_content=text,
+            metadata={"source": f"data/new_corpus/{i:02d}_lecture.pdf", "page": i, "total_pages": 60, "Author": "NLP course"},
+        )
+        for i in range(k)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-turn overhead of handling the retrieved sources.")
+    parser.add_argument("--k", type=int, default=cfg.TOP_K)
+    parser.add_argument("--chunk-size", type=int, default=cfg.CHUNK_SIZE)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    docs = make_docs(args.k, args.chunk_size)
+    # Before: serialize in the tool, then parse the string back in the service
+    legacy = timeit.timeit(lambda: legacy_parse(legacy_serialize(docs)), number=args.number) / args.number
+    # After: format the context once in the tool, pass the artifact through in the service
+    structured = timeit.timeit(lambda: (format_context(docs), to_source_records(docs)), number=args.number) / args.number
+
+    print(f"{args.k} chunks of {args.chunk_size} characters, {args.number} turns")
+    print(f"serialize + regex/eval parse: {legacy * 1e6:8.1f} us/turn")
+    print(f"format context + artifact:    {structured * 1e6:8.1f} us/turn")
+    print(f"speed-up: {legacy / structured:.1f}x")
+
+if __name__ == "__main__":
+    main()
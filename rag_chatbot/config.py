@@ -9,11 +9,119 @@ class Config:
     CHUNK_SIZE = 800
     CHUNK_OVERLAP = 80
     MIN_CHUNK_LENGTH = 50
+    # Layout-aware chunking: strip repeated headers/footers, merge consecutive short pages up to CHUNK_SIZE
+    # and drop exact and near-duplicate chunks before embedding
+    LAYOUT_AWARE_CHUNKING = True
+    BOILERPLATE_EDGE_LINES = 2 # Lines at the top and bottom of each page checked for headers and footers
+    BOILERPLATE_MIN_FRACTION = 0.5 # Fraction of the pages a line must appear on to be stripped
+    NEAR_DUPLICATE_DISTANCE = 8 # Maximum SimHash Hamming distance (of 64 bits) of near duplicates (None = exact only)
     TOP_K = 5
     DOCUMENTS_PATH = "data/new_corpus"
     VECTOR_STORE_PATH = "data/vector_store"
+    # Corpora served from separate vector stores (shards), each loaded on first use; empty = the single corpus above.
+    # Example: {"nlp": {"documents_path": "data/nlp", "vector_store_path": "data/vector_store/nlp", "keywords": ["nlp"]},
+    #           "syllabus": {"documents_path": "data/syllabus", "vector_store_path": "data/vector_store/syllabus", "always": True}}
+    CORPORA = {}
+    SHARD_ROUTING_MAX_SHARDS = 2 # Shards searched per query, besides the "always" ones
+    SHARD_ROUTING_MARGIN = 0.05 # Searched shards have a centroid similarity within this margin of the best one
+    # Incremental indexing: only new/changed PDFs are re-embedded, tracked by a manifest next to the index
+    INCREMENTAL_INDEXING = True
+    VECTOR_STORE_MANIFEST = "manifest.json"
+    # "mmap" memory-maps the FAISS index and reads chunks from an on-disk chunk store, "memory" unpickles the whole docstore
+    # (flat and HNSW indexes are mapped only by faiss versions with IO_FLAG_MMAP_IFC, older ones read them into memory)
+    VECTOR_STORE_LOAD_MODE = "mmap"
+    CHUNK_STORE_FILENAME = "chunks.sqlite"
+    EXTRACTION_WORKERS = None # Processes used to extract the PDFs (None = all CPU cores)
+    EMBEDDING_BATCH_SIZE = 64 # Chunks embedded and appended to the index at a time
+    BUILD_CHECKPOINT_INTERVAL = 1024 # Chunks between two checkpoints of an index build
+    # FAISS index type: "flat" (exact search), "ivf_flat", "hnsw" or "ivf_pq"
+    FAISS_INDEX_TYPE = "flat"
+    FAISS_NLIST = 256 # IVF: number of clusters
+    FAISS_NPROBE = 16 # IVF: clusters visited per query
+    FAISS_HNSW_M = 32 # HNSW: neighbours per node
+    FAISS_EF_CONSTRUCTION = 200 # HNSW: candidate list size while building
+    FAISS_EF_SEARCH = 64 # HNSW: candidate list size while searching
+    FAISS_PQ_M = 64 # PQ: sub-quantizers per vector (must divide the embedding dimension)
+    FAISS_PQ_NBITS = 8 # PQ: bits per sub-quantizer code
+    # Retrieval mode: "dense" (FAISS only) or "hybrid" (FAISS + BM25 fused with reciprocal-rank fusion)
+    RETRIEVAL_MODE = "hybrid"
+    HYBRID_SPARSE_WEIGHT = 0.3 # Weight of the BM25 ranking in the fusion (the dense ranking gets 1 - weight)
+    HYBRID_FETCH_K = 20 # Candidates fetched from each index before the fusion
+    RRF_K = 60 # Reciprocal-rank fusion constant
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    SPARSE_INDEX_FILENAME = "sparse_index.json"
+    # Rerank stage: over-fetch candidates and keep the best TOP_K that fit the context token budget
+    RERANK = True
+    RERANK_MODEL = None # CPU cross-encoder, e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2" (None = MMR diversity scoring)
+    RERANK_FETCH_K = 20 # Candidates rescored by the reranker
+    MMR_LAMBDA = 0.7 # MMR trade-off between relevance (1) and diversity (0)
+    CONTEXT_TOKEN_BUDGET = 1500 # Maximum estimated tokens of the chunks kept by the rerank stage for the LLM context
+    CONTEXT_TEMPLATE = "[{index}] {name}, page {page}\n{content}" # Format of each retrieved chunk in the LLM context
+    EMBEDDING_CACHE_PATH = "data/embedding_cache.sqlite"
+    EMBEDDING_CACHE_MEMORY_ITEMS = 4096 # Vectors kept in the in-memory LRU in front of the on-disk cache
     LLM_MODEL_NAME="mistral-large-latest"
     LLM_MODEL_PROVIDER="mistralai"
     MISTRAL_EMBEDDING_MODEL="mistral-embed"
     HF_EMBEDDING_MODEL="BAAI/bge-large-en-v1.5"
+    # Embedding backend: "torch" (reference), "int8" (PyTorch dynamic int8 quantization) or "onnx" (ONNX Runtime)
+    EMBEDDING_BACKEND = "torch"
+    EMBEDDING_ONNX_FILE = None # ONNX export to load, e.g. "onnx/model_qint8_avx512_vnni.onnx" (None = "onnx/model.onnx")
+    # An index embedded with another backend is kept if the cosine similarity between its vectors and the vectors of
+    # the configured backend is at least EMBEDDING_BACKEND_MIN_AGREEMENT on average, otherwise it is re-embedded
+    EMBEDDING_BACKEND_MIN_AGREEMENT = 0.99
+    EMBEDDING_VALIDATION_SAMPLES = 256 # Chunks re-embedded to measure the agreement
+    EMBEDDING_QUERY_BATCH_SIZE = 32 # Concurrent queries embedded in one forward pass (1 = no batching)
+    EMBEDDING_QUERY_BATCH_WAIT = 0.002 # Seconds a query waits for other queries to join its batch
     TEMPERATURE=0.3
+    LLM_MAX_RETRIES = 3
+    LLM_RETRY_BASE_DELAY = 1 # Seconds, doubled at every retry (with jitter)
+    LLM_RETRY_MAX_DELAY = 8 # Seconds
+    LLM_MAX_CONCURRENT_REQUESTS = 64 # Concurrent requests of the shared LLM client
+    # Routing mode: "llm" (the LLM decides whether to retrieve) or "local" (decided locally,
+    # falling back to the LLM only when the local score is between the two thresholds)
+    ROUTING_MODE = "local"
+    ROUTER_RETRIEVE_THRESHOLD = 0.6
+    ROUTER_RESPOND_THRESHOLD = 0.2
+    ROUTER_CENTROID_WEIGHT = 0.5 # Weight of the centroid similarity (the vocabulary overlap gets 1 - weight)
+    ROUTER_CENTROID_FLOOR = 0.3 # Centroid similarity scored 0
+    ROUTER_CENTROID_CEILING = 0.7 # Centroid similarity scored 1
+    CENTROID_FILENAME = "centroid.json"
+    # Retrieve the user query while the routing LLM call is in flight, and reuse the result if the LLM
+    # calls the retrieval tool with the same query or one with cosine similarity >= SPECULATIVE_SIMILARITY
+    SPECULATIVE_RETRIEVAL = True
+    SPECULATIVE_SIMILARITY = 0.9
+    SPECULATIVE_TTL = 60 # Seconds after which an unused speculative result is dropped
+    SPECULATIVE_WORKERS = 4 # Threads running speculative retrievals
+    # Conversation state: "sqlite" keeps the latest checkpoint of each thread on disk, "memory" keeps everything in RAM
+    CHECKPOINTER = "sqlite"
+    CHECKPOINT_DB_PATH = "data/checkpoints.sqlite"
+    HISTORY_MAX_TURNS = 6 # Recent turns sent verbatim to the LLM
+    HISTORY_FOLD_BATCH = 4 # Older turns are folded into the summary this many at a time
+    HISTORY_SUMMARY_WORDS = 150
+    HISTORY_FOLD_WORKERS = 4 # Threads folding histories in the background, after the answers
+    # Sessions share one graph and LLM client; idle or least recently used sessions are evicted
+    SESSION_TTL = 1800 # Seconds
+    MAX_SESSIONS = 1000
+    # Streamlit re-renders the streamed answer at most every STREAM_RENDER_INTERVAL seconds,
+    # or as soon as STREAM_RENDER_MAX_CHARS new characters have arrived
+    STREAM_RENDER_INTERVAL = 0.1
+    STREAM_RENDER_MAX_CHARS = 400
+    # Headless HTTP server: requests beyond HTTP_MAX_CONCURRENT_REQUESTS wait in a queue of at most
+    # HTTP_MAX_QUEUED_REQUESTS for HTTP_QUEUE_TIMEOUT seconds, then are rejected with 503
+    HTTP_HOST = "0.0.0.0"
+    HTTP_PORT = 8000
+    HTTP_MAX_CONCURRENT_REQUESTS = 32
+    HTTP_MAX_QUEUED_REQUESTS = 64
+    HTTP_QUEUE_TIMEOUT = 5 # Seconds
+    # Latency histograms and counters of every stage (cheap enough to stay on)
+    TELEMETRY = True
+    TELEMETRY_JSON_LOG = False # Also write every span as a JSON log line
+    TELEMETRY_LOG_PATH = None # File of the JSON log lines (None = stderr)
+    TELEMETRY_METRICS_PORT = None # Port of the Prometheus /metrics endpoint (None = disabled)
+    # Semantic answer cache in front of the graph
+    SEMANTIC_CACHE = True
+    SEMANTIC_CACHE_THRESHOLD = 0.95 # Minimum cosine similarity with a cached query
+    SEMANTIC_CACHE_TTL = 3600 # Seconds
+    SEMANTIC_CACHE_MAX_ENTRIES = 1000
+    SEMANTIC_CACHE_FIRST_TURN_ONLY = True # Follow-up questions depend on the conversation
@@ -4,21 +4,40 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 import time
+import uuid
+import random
+import asyncio
+import threading
 import httpx
+from typing import Annotated
 from langgraph.graph import MessagesState, StateGraph, END
-from langchain_core.messages import SystemMessage
-from langgraph.prebuilt import ToolNode, tools_condition
+from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, RemoveMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.prebuilt import ToolNode, InjectedState, tools_condition
 from langchain.chat_models import init_chat_model
 from langchain.tools import tool
 from langgraph.checkpoint.memory import MemorySaver
-from core.vector_store import VectorStoreManager
+from core.checkpointer import CompactSQLiteSaver
+from core.shard_router import get_retriever
+from core.speculative import SpeculativeRetrieval
+from core.query_router import RetrievalRouter, RETRIEVE, RESPOND
+from core.sources import format_context
+from core.telemetry import telemetry
 from config import Config as cfg
 
 # ==========================
 # Vector Store Manager
 # ==========================
-vector_store_manager = VectorStoreManager()
-vector_store_manager.load_or_generate_vector_store()
+# The vector store(s) and the embedding model are loaded on the first retrieval, not at import
+vector_store_manager = get_retriever()
+# Retrieval started while the routing LLM call is in flight
+speculative_retrieval = SpeculativeRetrieval(vector_store_manager)
+
+# ==========================
+# State
+# ==========================
+class ChatState(MessagesState):
+    summary: str # Rolling summary of the turns folded out of the message history
 
 # ==========================
 # Exceptions
@@ -30,21 +49,70 @@ class APICallException(Exception):
 # ChatGraph: Defines Conversation Flow
 # ==========================
 class ChatGraph:
-    def __init__(self):
-        """Initialize the conversation graph."""
-        self.llm_client = init_chat_model(
-            cfg.LLM_MODEL_NAME, 
-            model_provider=cfg.LLM_MODEL_PROVIDER,
-            temperature=cfg.TEMPERATURE)
-        self.graph_builder = StateGraph(MessagesState)
-        self.memory = MemorySaver()
+    _shared = None # Process-wide instance shared by all the sessions
+    _shared_lock = threading.Lock()
+
+    # Prepended to every LLM call instead of being stored in each conversation state
+    SYSTEM_PROMPT = SystemMessage(
+        '''You are an assistant for question-answering tasks about the Natural Language Processing and Large Language Models course of
+        University of Salerno. Ask only question about this topic, use also the context (if available) retrieved from the documents to answer the question.
+        You must ONLY answer questions related to the course, recognizing out-of-context questions and responding with "I'm sorry, I'm not enabled to provide answers
+        on topics outside of the course."
+        Always retrieve information before answering if the query is about NLP and Large Language Models or the course. Don't retrieve
+        only if the query is not related to the course otherwise try to retrieve information.''',
+        id="system_prompt"
+    )
+
+    def __init__(self, llm_client=None):
+        """Initialize the conversation graph, with the configured chat model unless another one is given."""
+        if llm_client is None:
+            # Mistral clients keep their HTTP connection pool; the semaphore bounds concurrent async requests
+            client_kwargs = {"max_concurrent_requests": cfg.LLM_MAX_CONCURRENT_REQUESTS} if cfg.LLM_MODEL_PROVIDER == "mistralai" else {}
+            llm_client = init_chat_model(
+                cfg.LLM_MODEL_NAME, 
+                model_provider=cfg.LLM_MODEL_PROVIDER,
+                temperature=cfg.TEMPERATURE,
+                **client_kwargs)
+        self.llm_client = llm_client
+        self.graph_builder = StateGraph(ChatState)
+        if cfg.CHECKPOINTER == "sqlite":
+            # Conversations survive restarts and only the latest checkpoint of each thread is kept
+            self.memory = CompactSQLiteSaver(cfg.CHECKPOINT_DB_PATH)
+            self.memory.vacuum()
+        else:
+            self.memory = MemorySaver()
+        self.router = RetrievalRouter(vector_store_manager)
         self._build_graph()
 
+    @classmethod
+    def shared(cls):
+        """Return the process-wide graph: one compiled graph and one LLM client serve every session."""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    @staticmethod
+    def _node(name, func, afunc):
+        """Graph node with a sync and an async implementation, each call recorded as a span."""
+        return RunnableLambda(
+            telemetry.timed("node", func, node=name), afunc=telemetry.timed("node", afunc, node=name), name=name
+        )
+
     def _build_graph(self):
         """Construct the state graph."""
-        self.graph_builder.add_node(self.query_or_respond)
+        # Every node has a sync and an async implementation, used by invoke/stream and ainvoke/astream
+        # In "local" routing mode clear retrieval decisions skip the tool-routing LLM round-trip
+        if cfg.ROUTING_MODE == "local":
+            router_node = self._node("query_or_respond", self.route_locally, self.aroute_locally)
+        else:
+            router_node = self._node("query_or_respond", self.query_or_respond, self.aquery_or_respond)
+        self.graph_builder.add_node("query_or_respond", router_node)
         self.graph_builder.add_node(self.get_tools())
-        self.graph_builder.add_node(self.generate_response)
+        self.graph_builder.add_node(
+            "generate_response", self._node("generate_response", self.generate_response, self.agenerate_response)
+        )
 
         self.graph_builder.set_entry_point("query_or_respond")
         self.graph_builder.add_conditional_edges(
@@ -54,50 +122,162 @@ class ChatGraph:
         self.graph_builder.add_edge("generate_response", END)
 
         self.graph = self.graph_builder.compile(checkpointer=self.memory)
+
+    @staticmethod
+    def _backoff_delay(retries):
+        """Exponential backoff with jitter, so that concurrent sessions do not retry in lockstep."""
+        delay = min(cfg.LLM_RETRY_MAX_DELAY, cfg.LLM_RETRY_BASE_DELAY * 2 ** retries)
+        return random.uniform(delay / 2, delay)
     
-    def _safe_invoke(self, llm, input, max_retries=3):
+    def _safe_invoke(self, llm, input, max_retries=cfg.LLM_MAX_RETRIES):
         """Invoke the LLM with retries in case of network errors."""
         retries = 0
         while retries < max_retries:
             try:
-                return llm.invoke(input)
+                with telemetry.span("llm_call"):
+                    return llm.invoke(input)
+            except httpx.HTTPStatusError as e:
+                print(f"HTTP error: {e}. Retrying...")
+                telemetry.increment("llm_retries_total", reason="http")
+            except httpx.RequestError as e:
+                print(f"Network error: {e}. Retrying...")
+                telemetry.increment("llm_retries_total", reason="network")
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                break  # Stop retrying for unknown errors
+
+            time.sleep(self._backoff_delay(retries))
+            retries += 1
+        # Raise exception if max retries reached
+        telemetry.increment("llm_failures_total")
+        raise APICallException("Failed to invoke the language model after multiple retries.")
+
+    async def _asafe_invoke(self, llm, input, max_retries=cfg.LLM_MAX_RETRIES):
+        """Invoke the LLM asynchronously with retries in case of network errors, without blocking the event loop."""
+        retries = 0
+        while retries < max_retries:
+            try:
+                with telemetry.span("llm_call"):
+                    return await llm.ainvoke(input)
             except httpx.HTTPStatusError as e:
-                print(f"HTTP error: {e}. Retrying in 1s...")
+                print(f"HTTP error: {e}. Retrying...")
+                telemetry.increment("llm_retries_total", reason="http")
             except httpx.RequestError as e:
-                print(f"Network error: {e}. Retrying in 1s...")
+                print(f"Network error: {e}. Retrying...")
+                telemetry.increment("llm_retries_total", reason="network")
             except Exception as e:
                 print(f"Unexpected error: {e}")
                 break  # Stop retrying for unknown errors
 
+            await asyncio.sleep(self._backoff_delay(retries))
             retries += 1
-            time.sleep(1)
         # Raise exception if max retries reached
+        telemetry.increment("llm_failures_total")
         raise APICallException("Failed to invoke the language model after multiple retries.")
 
+    def _summary_messages(self, state: ChatState):
+        summary = state.get("summary")
+        return [SystemMessage(f"Summary of the earlier conversation: {summary}")] if summary else []
+
+    def _with_history(self, state: ChatState):
+        """System prompt, summary of the folded turns and recent messages."""
+        return [self.SYSTEM_PROMPT] + self._summary_messages(state) + state["messages"]
+
     # Step 1: Generate an AIMessage that may include a tool-call to be sent.
-    def query_or_respond(self, state: MessagesState):
+    def _speculate(self, state: ChatState):
+        """Start retrieving the user query before the LLM decides whether to retrieve. Returns the query."""
+        query = self._last_query(state)
+        if cfg.SPECULATIVE_RETRIEVAL and query is not None:
+            speculative_retrieval.start(query)
+            return query
+        return None
+
+    @staticmethod
+    def _end_speculation(query, response):
+        # The tool takes the speculative result; without a tool call it is not needed
+        if query is not None and not (response and response.tool_calls):
+            speculative_retrieval.discard(query)
+
+    def query_or_respond(self, state: ChatState):
         """Generate a response or call the retrieval tool if needed."""
         llm_with_tools = self.llm_client.bind_tools([self.retrieve])
-        response = self._safe_invoke(llm_with_tools, state["messages"])
+        query = self._speculate(state)
+        try:
+            response = self._safe_invoke(llm_with_tools, self._with_history(state))
+        except APICallException:
+            self._end_speculation(query, None)
+            raise
+        self._end_speculation(query, response)
+        return {"messages": [response]} if response else {"messages": []}
+
+    async def aquery_or_respond(self, state: ChatState):
+        llm_with_tools = self.llm_client.bind_tools([self.retrieve])
+        query = self._speculate(state)
+        try:
+            response = await self._asafe_invoke(llm_with_tools, self._with_history(state))
+        except APICallException:
+            self._end_speculation(query, None)
+            raise
+        self._end_speculation(query, response)
         return {"messages": [response]} if response else {"messages": []}
 
+    # Step 1 (local routing): decide without the LLM whether the query needs retrieval.
+    @staticmethod
+    def _last_query(state: ChatState):
+        return next((message.content for message in reversed(state["messages"]) if message.type == "human"), None)
+
+    @staticmethod
+    def _retrieval_call(query):
+        """AIMessage calling the retrieval tool, as the LLM router would emit it."""
+        tool_call = {"name": "retrieve", "args": {"query": query}, "id": f"call_{uuid.uuid4().hex}", "type": "tool_call"}
+        return {"messages": [AIMessage(content="", tool_calls=[tool_call])]}
+
+    def route_locally(self, state: ChatState):
+        """Call the retrieval tool directly, answer directly, or fall back to the LLM router if the query is ambiguous."""
+        query = self._last_query(state)
+        decision = self.router.route(query) if query is not None else None
+        if decision == RETRIEVE:
+            return self._retrieval_call(query)
+        if decision == RESPOND:
+            return {"messages": [self._safe_invoke(self.llm_client, self._with_history(state))]}
+        return self.query_or_respond(state)
+
+    async def aroute_locally(self, state: ChatState):
+        query = self._last_query(state)
+        # Embedding the query is CPU-bound: keep it off the event loop
+        decision = await asyncio.to_thread(self.router.route, query) if query is not None else None
+        if decision == RETRIEVE:
+            return self._retrieval_call(query)
+        if decision == RESPOND:
+            return {"messages": [await self._asafe_invoke(self.llm_client, self._with_history(state))]}
+        return await self.aquery_or_respond(state)
+
     # Step 2: Execute the retrieval.
     @staticmethod
     @tool(response_format="content_and_artifact")
-    def retrieve(query: str):
+    def retrieve(query: str, state: Annotated[dict, InjectedState]):
         """Retrieve relevant documents from the vector store."""
-        retrieved_docs = vector_store_manager.vector_store.similarity_search(query, k=cfg.TOP_K) # It is also possible to set a score threshold ex: score_threshold=0.8
-        serialized = "\n\n".join(
-            (f"Source: {doc.metadata}\nContent: {doc.page_content}") for doc in retrieved_docs
-        )
-        return serialized, retrieved_docs
+        # The tool node is built by LangGraph, so its span is recorded here
+        with telemetry.span("node", node="tools"):
+            user_query = ChatGraph._last_query(state)
+            speculative = speculative_retrieval.take(user_query, query) if cfg.SPECULATIVE_RETRIEVAL and user_query else None
+            if speculative is not None:
+                retrieved_docs, timings = speculative
+            else:
+                timings = {}
+                retrieved_docs = vector_store_manager.search(query, k=cfg.TOP_K, timings=timings)
+        # Embedding, FAISS search, BM25 search, docstore fetch and rerank
+        for stage, ms in timings.items():
+            telemetry.observe("retrieval_stage_seconds", ms / 1000, stage=stage.removesuffix("_ms"))
+        # The context string is built once here; the service uses the documents in the artifact as they are
+        return format_context(retrieved_docs), retrieved_docs
     
     def get_tools(self):
         return ToolNode([self.retrieve])
 
     # Step 3: Generate a response using the retrieved content.
-    def generate_response(self, state: MessagesState):
-        """Generate answer."""
+    def _generation_prompt(self, state: ChatState):
+        """Build the prompt of the answer from the retrieved context and the conversation."""
         # Get generated ToolMessages
         recent_tool_messages = []
         for message in reversed(state["messages"]):
@@ -123,9 +303,67 @@ class ChatGraph:
             if message.type in ("human", "system")
             or (message.type == "ai" and not message.tool_calls)
         ]
-        prompt = [SystemMessage(system_message_content)] + conversation_messages
+        return [SystemMessage(system_message_content), self.SYSTEM_PROMPT] + self._summary_messages(state) + conversation_messages
+
+    def generate_response(self, state: ChatState):
+        """Generate answer."""
+        response = self._safe_invoke(self.llm_client, self._generation_prompt(state))
+        return {"messages": [response]}
+
+    async def agenerate_response(self, state: ChatState):
+        response = await self._asafe_invoke(self.llm_client, self._generation_prompt(state))
+        return {"messages": [response]}
+
+    # After the turn: keep the history bounded.
+    @staticmethod
+    def _turns_to_fold(state: ChatState):
+        """
+        Return the messages of the oldest turns once the history exceeds HISTORY_MAX_TURNS + HISTORY_FOLD_BATCH turns,
+        leaving the last HISTORY_MAX_TURNS turns verbatim. Folding in batches keeps summarization calls rare.
+        """
+        messages = state["messages"]
+        human_indexes = [i for i, message in enumerate(messages) if message.type == "human"]
+        if len(human_indexes) <= cfg.HISTORY_MAX_TURNS + cfg.HISTORY_FOLD_BATCH:
+            return []
+        return messages[:human_indexes[-cfg.HISTORY_MAX_TURNS]]
+
+    def _summary_prompt(self, state: ChatState, folded):
+        # Only questions and answers are summarized: retrieved context and tool calls are not needed later
+        transcript = "\n".join(
+            f"{'Student' if message.type == 'human' else 'Assistant'}: {message.content}"
+            for message in folded
+            if message.type == "human" or (message.type == "ai" and not message.tool_calls)
+        )
+        return [HumanMessage(
+            "Update the summary of a conversation between a student and the course assistant with the new turns below. "
+            f"Keep the facts and questions useful for follow-up questions, in at most {cfg.HISTORY_SUMMARY_WORDS} words. "
+            "Reply with the summary only.\n\n"
+            f"Current summary: {state.get('summary') or '(empty)'}\n\nNew turns:\n{transcript}"
+        )]
+
+    @staticmethod
+    def _fold_update(summary, folded):
+        return {"summary": summary.content, "messages": [RemoveMessage(id=message.id) for message in folded]}
+
+    def fold_history(self, config):
+        """
+        Fold the oldest turns of a conversation into its rolling summary.
+        Not a graph node: the service runs it after the answer has been returned, so the summarization call is
+        never on the response path.
+        """
+        state = self.graph.get_state(config).values
+        folded = self._turns_to_fold(state) if state.get("messages") else []
+        if not folded:
+            return
+        with telemetry.span("node", node="summarize_history"):
+            summary = self._safe_invoke(self.llm_client, self._summary_prompt(state, folded))
+        self.graph.update_state(config, self._fold_update(summary, folded), as_node="generate_response")
 
-        # Run
-        response = self._safe_invoke(self.llm_client, prompt)
-            
-        return {"messages": [response]}
\ No newline at end of file
+    async def afold_history(self, config):
+        state = (await self.graph.aget_state(config)).values
+        folded = self._turns_to_fold(state) if state.get("messages") else []
+        if not folded:
+            return
+        with telemetry.span("node", node="summarize_history"):
+            summary = await self._asafe_invoke(self.llm_client, self._summary_prompt(state, folded))
+        await self.graph.aupdate_state(config, self._fold_update(summary, folded), as_node="generate_response")
@@ -0,0 +1,193 @@
+import sys
+import os
+import asyncio
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple, WRITES_IDX_MAP, get_checkpoint_id
+
+class CompactSQLiteSaver(BaseCheckpointSaver):
+    '''
+    Disk-backed checkpointer that keeps only the latest checkpoint of each thread.
+    Conversations survive restarts, and storage grows with the number of threads instead of the number of steps.
+    Checkpoint history (time travel) is not available. Threads not updated for a while are deleted by
+    delete_threads_before.'''
+
+    def __init__(self, path):
+        super().__init__()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT, type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB,
+                    updated_at REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"""
+            )
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(checkpoints)")}
+            if "updated_at" not in columns:
+                # Databases created before the update time was recorded: their threads count as updated now
+                self._connection.execute("ALTER TABLE checkpoints ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+                self._connection.execute("UPDATE checkpoints SET updated_at = ?", (time.time(),))
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT, value BLOB,
+                    task_path TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"""
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def _config(thread_id, checkpoint_ns, checkpoint_id):
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    def _to_tuple(self, row):
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._connection.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=self._config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, value))) for task_id, channel, t, value in writes],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                 "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?")
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._connection.execute(query, params).fetchone()
+            return self._to_tuple(row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                 "FROM checkpoints")
+        conditions, params = [], []
+        if config is not None:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                conditions.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+        if before is not None:
+            conditions.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            tuples = [self._to_tuple(row) for row in self._connection.execute(query, params).fetchall()]
+        count = 0
+        for checkpoint_tuple in tuples:
+            if filter and any(checkpoint_tuple.metadata.get(key) != value for key, value in filter.items()):
+                continue
+            yield checkpoint_tuple
+            count += 1
+            if limit is not None and count >= limit:
+                break
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, "
+                "checkpoint, metadata_type, metadata, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_id, type_, serialized_checkpoint, metadata_type,
+                 serialized_metadata, time.time()),
+            )
+            # Compaction: the new checkpoint supersedes the previous ones and their pending writes
+            self._connection.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"]),
+            )
+            self._connection.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"]),
+            )
+            self._connection.commit()
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for i, (channel, value) in enumerate(writes):
+            type_, serialized_value = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, i), channel,
+                         type_, serialized_value, task_path))
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._connection.commit()
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self._connection.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._connection.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self._connection.commit()
+
+    def delete_threads_before(self, timestamp, keep=()):
+        """
+        Delete the threads whose latest checkpoint is older than the timestamp (seconds since the epoch),
+        except the ones in keep.
+
+        Returns:
+            list: IDs of the deleted threads
+        """
+        keep = set(keep)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?", (timestamp,)
+            ).fetchall()
+            thread_ids = [(thread_id,) for thread_id, in rows if thread_id not in keep]
+            self._connection.executemany("DELETE FROM checkpoints WHERE thread_id = ?", thread_ids)
+            self._connection.executemany("DELETE FROM writes WHERE thread_id = ?", thread_ids)
+            self._connection.commit()
+        return [thread_id for thread_id, in thread_ids]
+
+    def vacuum(self):
+        """Give the space of deleted checkpoints back to the file system."""
+        with self._lock:
+            self._connection.execute("VACUUM")
+
+    # SQLite calls are short: the async API runs them in a worker thread
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        tuples = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.delete_thread, thread_id)
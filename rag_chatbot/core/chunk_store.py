@@ -0,0 +1,94 @@
+import sys
+import os
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+class SQLiteDocstore(Docstore):
+    '''
+    Read-only docstore backed by an SQLite file: chunk text is fetched by ID only for the search hits,
+    instead of unpickling the whole InMemoryDocstore at startup.'''
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def search(self, search):
+        with self._lock:
+            row = self._connection.execute("SELECT content, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."  # Same contract as InMemoryDocstore
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts):
+        raise NotImplementedError("SQLiteDocstore is read-only. Update the vector store in memory mode.")
+
+    def delete(self, ids):
+        raise NotImplementedError("SQLiteDocstore is read-only. Update the vector store in memory mode.")
+
+    def index_to_docstore_id(self):
+        """Return a lazy mapping from FAISS positions to chunk IDs."""
+        return _PositionMap(self)
+
+    def positions(self, chunk_ids):
+        """Return the FAISS positions of the given chunk IDs."""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id, position FROM positions WHERE id IN ({','.join('?' * len(chunk_ids))})", list(chunk_ids)
+            ).fetchall()
+        return dict(rows)
+
+class _PositionMap(Mapping):
+    '''
+    Mapping from FAISS positions to chunk IDs, read from the chunk store on access.'''
+
+    def __init__(self, docstore):
+        self._docstore = docstore
+
+    def __getitem__(self, position):
+        with self._docstore._lock:
+            row = self._docstore._connection.execute(
+                "SELECT id FROM positions WHERE position = ?", (int(position),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __iter__(self):
+        with self._docstore._lock:
+            rows = self._docstore._connection.execute("SELECT position FROM positions ORDER BY position").fetchall()
+        return iter(row[0] for row in rows)
+
+    def __len__(self):
+        with self._docstore._lock:
+            return self._docstore._connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+def write_chunk_store(path, vector_store):
+    """Export the docstore and the position mapping of a FAISS vector store to an SQLite chunk store."""
+    path = Path(path)
+    tmp_path = path.with_suffix('.tmp')
+    if tmp_path.exists():
+        tmp_path.unlink()
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.execute("CREATE TABLE chunks (id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL)")
+        connection.execute("CREATE TABLE positions (position INTEGER PRIMARY KEY, id TEXT NOT NULL)")
+        rows = []
+        for position, chunk_id in vector_store.index_to_docstore_id.items():
+            doc = vector_store.docstore.search(chunk_id)
+            rows.append((position, chunk_id, doc.page_content, json.dumps(doc.metadata)))
+        connection.executemany("INSERT INTO positions (position, id) VALUES (?, ?)", [row[:2] for row in rows])
+        connection.executemany("INSERT INTO chunks (id, content, metadata) VALUES (?, ?, ?)", [row[1:] for row in rows])
+        connection.execute("CREATE INDEX positions_id ON positions (id)")
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
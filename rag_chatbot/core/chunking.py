@@ -0,0 +1,133 @@
+import sys
+import os
+import re
+import hashlib
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from langchain_core.documents import Document
+from config import Config as cfg
+
+def _line_key(line):
+    # Page numbers and dates change from page to page: "Page 3 of 40" and "Page 4 of 40" are the same footer
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+def strip_boilerplate(docs, edge_lines=cfg.BOILERPLATE_EDGE_LINES, min_fraction=cfg.BOILERPLATE_MIN_FRACTION):
+    """
+    Remove the headers and footers repeated across the pages of a document.
+
+    A line is boilerplate if it appears (ignoring digits) among the first or last `edge_lines` lines of at least
+    `min_fraction` of the pages, and of at least 3 pages.
+
+    Returns:
+        tuple: The cleaned pages and the number of lines removed
+    """
+    pages = [[line for line in (doc.page_content or "").splitlines() if line.strip()] for doc in docs]
+    if len(pages) < 3:
+        return docs, 0
+
+    def edges(lines):
+        return range(len(lines)) if len(lines) <= 2 * edge_lines else [*range(edge_lines), *range(len(lines) - edge_lines, len(lines))]
+
+    counts = Counter()
+    for lines in pages:
+        counts.update({_line_key(lines[i]) for i in edges(lines)})
+    boilerplate = {key for key, count in counts.items() if count >= max(3, min_fraction * len(pages))}
+    if not boilerplate:
+        return docs, 0
+
+    cleaned, removed = [], 0
+    for doc, lines in zip(docs, pages):
+        drop = {i for i in edges(lines) if _line_key(lines[i]) in boilerplate}
+        removed += len(drop)
+        cleaned.append(Document(
+            page_content="\n".join(line for i, line in enumerate(lines) if i not in drop), metadata=doc.metadata
+        ))
+    return cleaned, removed
+
+def merge_short_pages(docs, chunk_size=cfg.CHUNK_SIZE):
+    """
+    Merge consecutive pages of a document while the merged text fits in one chunk, so that short slides are kept
+    together with their neighbours instead of being dropped or embedded alone. Empty pages are skipped.
+    The merged page keeps the metadata of its first page, plus the number of its last page in "last_page".
+    """
+    merged = []
+    current = None
+    for doc in docs:
+        text = (doc.page_content or "").strip()
+        if not text:
+            continue
+        if current is not None and len(current.page_content) + 2 + len(text) <= chunk_size:
+            current.page_content += "\n\n" + text
+            current.metadata["last_page"] = doc.metadata.get("page")
+        else:
+            current = Document(page_content=text, metadata=dict(doc.metadata))
+            merged.append(current)
+    return merged
+
+def simhash(text):
+    """64-bit SimHash of the word 3-grams of the text: near-duplicate texts differ in a few bits."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingles],
+        dtype=np.uint64
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+class Deduplicator:
+    '''
+    Detects exact duplicates by content hash and near-duplicates by SimHash Hamming distance.
+    Fingerprints are split in max_distance + 1 bands: two fingerprints within max_distance bits of each other
+    have at least one identical band, so only the fingerprints sharing a band are compared.'''
+
+    def __init__(self, max_distance=cfg.NEAR_DUPLICATE_DISTANCE):
+        self.max_distance = max_distance
+        self._hashes = set()
+        self._band_bits = 64 // (max_distance + 1) if max_distance is not None else 0
+        self._bands = [{} for _ in range(max_distance + 1)] if max_distance is not None else []
+
+    def is_duplicate(self, text):
+        """Return True if the text duplicates a text seen before, remembering it otherwise."""
+        normalized = " ".join(text.lower().split())
+        digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+        if digest in self._hashes:
+            return True
+        self._hashes.add(digest)
+        if self.max_distance is None:
+            return False
+
+        fingerprint = simhash(normalized)
+        keys = [(fingerprint >> (band * self._band_bits)) & ((1 << self._band_bits) - 1) for band in range(len(self._bands))]
+        for band, key in enumerate(keys):
+            for other in self._bands[band].get(key, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return True
+        for band, key in enumerate(keys):
+            self._bands[band].setdefault(key, []).append(fingerprint)
+        return False
+
+def chunk_documents(docs, text_splitter, stats):
+    """
+    Layout-aware chunking of the pages of one document: strip repeated headers and footers, merge consecutive short
+    pages, split, drop chunks shorter than MIN_CHUNK_LENGTH and drop exact and near-duplicate chunks.
+    Duplicates are detected within the document, so that incremental updates of other documents never affect it.
+    """
+    stats["pages"] += len(docs)
+    docs, stripped = strip_boilerplate(docs)
+    stats["boilerplate_lines"] += stripped
+    docs = merge_short_pages(docs)
+    stats["merged_pages"] += len(docs)
+
+    chunks = text_splitter.split_documents(docs)
+    stats["chunks"] += len(chunks)
+    chunks = [chunk for chunk in chunks if len(chunk.page_content.strip()) >= cfg.MIN_CHUNK_LENGTH]
+    deduplicator = Deduplicator()
+    kept = [chunk for chunk in chunks if not deduplicator.is_duplicate(chunk.page_content)]
+    stats["duplicates"] += len(chunks) - len(kept)
+    stats["kept"] += len(kept)
+    return kept
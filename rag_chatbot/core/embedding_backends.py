@@ -0,0 +1,117 @@
+import sys
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceBgeEmbeddings
+from config import Config as cfg
+from core.telemetry import telemetry
+
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+
+def load_embeddings(backend=cfg.EMBEDDING_BACKEND, model_name=cfg.HF_EMBEDDING_MODEL):
+    """
+    Load the embedding model with the given backend.
+
+    "torch" runs the model in PyTorch and is the reference the other backends are validated against.
+    "int8" quantizes the linear layers of the model to int8 with PyTorch dynamic quantization.
+    "onnx" runs an ONNX Runtime export of the model (requires optimum[onnxruntime]); EMBEDDING_ONNX_FILE selects
+    a quantized export, e.g. "onnx/model_qint8_avx512_vnni.onnx".
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of {EMBEDDING_BACKENDS}.")
+    model_kwargs = {}
+    if backend == "onnx":
+        model_kwargs = {"backend": "onnx", "device": "cpu"}
+        if cfg.EMBEDDING_ONNX_FILE:
+            model_kwargs["model_kwargs"] = {"file_name": cfg.EMBEDDING_ONNX_FILE}
+
+    embeddings = HuggingFaceBgeEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    if backend == "int8":
+        import torch
+        embeddings.client.to("cpu")
+        torch.ao.quantization.quantize_dynamic(embeddings.client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return embeddings
+
+def embed_queries(embeddings, texts):
+    """Embed several queries, in one forward pass when the model allows it."""
+    if getattr(embeddings, "embed_instruction", None) == "" and hasattr(embeddings, "query_instruction"):
+        # BGE embeds a query as a document prefixed with the query instruction
+        return embeddings.embed_documents([embeddings.query_instruction + text for text in texts])
+    return [embeddings.embed_query(text) for text in texts]
+
+class QueryBatcher(Embeddings):
+    '''
+    Groups the queries embedded concurrently by different threads into one forward pass of the model.
+    A query waits at most max_wait seconds for other queries to join its batch; documents are embedded directly,
+    since index builds already send them in batches.'''
+
+    def __init__(self, embeddings, max_batch=cfg.EMBEDDING_QUERY_BATCH_SIZE, max_wait=cfg.EMBEDDING_QUERY_BATCH_WAIT):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._worker.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.perf_counter())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                vectors = embed_queries(self.embeddings, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            telemetry.increment("embedding_query_batches_total")
+            telemetry.increment("embedding_batched_queries_total", len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def embed_query(self, text):
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+def backend_agreement(embeddings, vector_store, samples=cfg.EMBEDDING_VALIDATION_SAMPLES, seed=0):
+    """
+    Compare the vectors stored in the index with the vectors the given embeddings compute for the same chunks,
+    on a random sample of chunks.
+
+    Returns:
+        dict: Mean and minimum cosine similarity, and number of chunks compared
+    """
+    index = vector_store.index
+    if index.ntotal == 0:
+        return {"mean": 1.0, "min": 1.0, "samples": 0}
+    positions = np.random.default_rng(seed).choice(index.ntotal, size=min(samples, index.ntotal), replace=False)
+    stored = np.vstack([index.reconstruct(int(position)) for position in positions])
+    texts = [vector_store.docstore.search(vector_store.index_to_docstore_id[int(position)]).page_content
+             for position in positions]
+    computed = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    norms = np.linalg.norm(stored, axis=1) * np.linalg.norm(computed, axis=1)
+    cosines = (stored * computed).sum(axis=1) / np.maximum(norms, 1e-12)
+    return {"mean": float(cosines.mean()), "min": float(cosines.min()), "samples": len(positions)}
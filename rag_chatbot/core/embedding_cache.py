@@ -0,0 +1,119 @@
+import sys
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.embeddings import Embeddings
+from core.telemetry import telemetry
+
+class CachedEmbeddings(Embeddings):
+    '''
+    Embeddings wrapper with a persistent cache keyed by a hash of the text and the model name.
+    A bounded in-memory LRU sits in front of the on-disk SQLite cache.'''
+
+    def __init__(self, embeddings, model_name, cache_path, max_memory_items=4096):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._connection.commit()
+
+    def _key(self, text, kind):
+        # Queries and documents are cached separately: BGE prepends an instruction to queries
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys):
+        """Return the cached vectors of the keys found in memory or on disk."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.hits["memory"] += 1
+            missing = [key for key in keys if key not in found]
+            # SQLite limits the number of bound parameters, so query the disk cache in slices
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[key] = vector
+                    self._remember(key, vector)
+                    self.hits["disk"] += 1
+        return found
+
+    def _store(self, entries):
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in entries.items()],
+            )
+            self._connection.commit()
+            for key, vector in entries.items():
+                self._remember(key, vector)
+
+    def _embed(self, texts, kind):
+        keys = [self._key(text, kind) for text in texts]
+        found = self._lookup(keys)
+
+        # Embed each missing text only once, even if it appears several times in the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        telemetry.increment("embedding_cache_hits_total", len(keys) - len(missing), kind=kind)
+        if missing:
+            self.misses += len(missing)
+            telemetry.increment("embedding_cache_misses_total", len(missing), kind=kind)
+            with telemetry.span("embedding", kind=kind):
+                if kind == "query":
+                    vectors = [self.embeddings.embed_query(text) for text in missing.values()]
+                else:
+                    vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = {key: array('f', vector) for key, vector in zip(missing, vectors)}
+            self._store(computed)
+            found.update(computed)
+
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(texts, "document")
+
+    def embed_query(self, text):
+        return self._embed([text], "query")[0]
+
+    def stats(self):
+        """Return the hit/miss counters of the cache."""
+        hits = self.hits["memory"] + self.hits["disk"]
+        total = hits + self.misses
+        return {
+            "memory_hits": self.hits["memory"],
+            "disk_hits": self.hits["disk"],
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_items": len(self._memory),
+        }
@@ -0,0 +1,103 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import faiss
+import numpy as np
+from config import Config as cfg
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# Vectors per IVF cluster recommended by FAISS to train the coarse quantizer
+MIN_POINTS_PER_CENTROID = 39
+
+def index_params_from_config():
+    """Return the index type and the parameters configured in Config."""
+    return cfg.FAISS_INDEX_TYPE, {
+        "nlist": cfg.FAISS_NLIST,
+        "nprobe": cfg.FAISS_NPROBE,
+        "M": cfg.FAISS_HNSW_M,
+        "ef_construction": cfg.FAISS_EF_CONSTRUCTION,
+        "ef_search": cfg.FAISS_EF_SEARCH,
+        "pq_m": cfg.FAISS_PQ_M,
+        "pq_nbits": cfg.FAISS_PQ_NBITS,
+    }
+
+def build_params(index_type, params):
+    """Parameters that require rebuilding the index when they change (search-time ones are excluded)."""
+    keys = {
+        "flat": (),
+        "ivf_flat": ("nlist",),
+        "hnsw": ("M", "ef_construction"),
+        "ivf_pq": ("nlist", "pq_m", "pq_nbits"),
+    }[index_type]
+    return {key: params[key] for key in keys}
+
+def build_index(vectors, index_type, params):
+    """
+    Train an index of the given type on the vectors and add them, preserving their order.
+
+    Args:
+        vectors (np.ndarray): float32 matrix of shape (n, d)
+        index_type (str): One of INDEX_TYPES
+        params (dict): Index parameters (see index_params_from_config)
+
+    Returns:
+        faiss.Index: The trained index, with search-time parameters applied
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+    n, d = vectors.shape
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # Small corpora cannot train many clusters
+        nlist = max(1, min(params["nlist"], n // MIN_POINTS_PER_CENTROID))
+        if nlist != params["nlist"]:
+            print(f"Warning: {n} vectors are not enough to train {params['nlist']} clusters, using {nlist}.")
+        quantizer = faiss.IndexFlatL2(d)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_L2)
+        else:
+            if d % params["pq_m"] != 0:
+                raise ValueError(f"FAISS_PQ_M ({params['pq_m']}) must divide the embedding dimension ({d}).")
+            if n < 2 ** params["pq_nbits"]:
+                raise ValueError(f"IVF-PQ needs at least {2 ** params['pq_nbits']} vectors to train, got {n}.")
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, params["pq_m"], params["pq_nbits"])
+        index.train(vectors)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, params["M"])
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        index = faiss.IndexFlatL2(d)
+
+    index.add(vectors)
+    configure_search(index, params)
+    return index
+
+def configure_search(index, params):
+    """Apply the search-time parameters (nprobe, efSearch) to the index."""
+    if hasattr(index, "nprobe"):
+        index.nprobe = params["nprobe"]
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = params["ef_search"]
+
+def mmap_io_flags(index_type):
+    """
+    Flags to read an index of the given type memory-mapped. IO_FLAG_MMAP only maps the inverted lists of IVF indexes:
+    the codes of flat and HNSW indexes are mapped with IO_FLAG_MMAP_IFC, and read into memory by faiss versions without it.
+    """
+    if index_type.startswith("ivf") or not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+def enable_reconstruct(index):
+    """Let an IVF index return stored vectors by position, as flat and HNSW indexes do (IVF-PQ ones approximately)."""
+    if hasattr(index, "nprobe"):
+        faiss.extract_index_ivf(index).make_direct_map()
+
+def reconstruct_vectors(index):
+    """Return all the vectors stored in a flat index, in insertion order."""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
@@ -0,0 +1,55 @@
+import sys
+import os
+import time
+import multiprocessing
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import pdfplumber
+
+# PDF extraction runs in worker processes: this module imports only what they need, so that they start quickly
+
+def extraction_context():
+    """
+    Start method of the extraction processes. They are not forked from the application, which already runs threads
+    (query batcher, thread pools, server) whose locks a fork could copy while held: the fork server starts them from
+    a clean process, spawn where it is not available.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+def extract_pdf(pdf_path):
+    """
+    Extract the pages of a PDF, opening it only once. Runs in a worker process.
+
+    For slides (filenames starting with a number) the first and the last page are skipped.
+    Pages are returned as (text, metadata) tuples so that the result is cheap to pickle.
+    """
+    start = time.perf_counter()
+    filename = Path(pdf_path).name
+    result = {"source": pdf_path, "pages": [], "mode": "all pages", "warning": None, "error": None}
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            total_pages = len(pdf.pages)
+            page_range = range(total_pages)
+            # Same metadata as PDFPlumberLoader for the documents loaded in full
+            metadata = {k: v for k, v in pdf.metadata.items() if type(v) in [str, int]}
+            metadata.update({"source": pdf_path, "file_path": pdf_path})
+            # We will esclude the first and the last page only for the slides
+            if filename[0].isdigit():
+                if total_pages <= 2:  # Not enough pages to skip first and last
+                    result["warning"] = (f"{filename} has only {total_pages} pages, need at least 3 to skip first and last. "
+                                         "Loading all pages.")
+                else:
+                    page_range = range(1, total_pages - 1)  # Skip page 0 and the last page
+                    metadata = {"source": pdf_path}
+                    result["mode"] = "skipped first and last pages"
+            for i in page_range:
+                text = pdf.pages[i].extract_text()
+                result["pages"].append((text, {**metadata, "page": i, "total_pages": total_pages}))
+    except Exception as e:
+        result["error"] = str(e)
+    result["elapsed"] = time.perf_counter() - start
+    return result
@@ -0,0 +1,71 @@
+import sys
+import os
+import re
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from config import Config as cfg
+from core.sparse_index import tokenize
+
+RETRIEVE = "retrieve"
+RESPOND = "respond"
+AMBIGUOUS = "ambiguous"
+
+# Small talk that never needs the course material
+SMALL_TALK_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|good (morning|afternoon|evening)|thanks?( you)?( very much)?|thank you|ok(ay)?|bye|goodbye|"
+    r"see you|who are you|what can you do|how are you)\W*$",
+    re.IGNORECASE,
+)
+
+# Questions about the course organisation are always answered from the syllabus
+COURSE_KEYWORDS = {
+    "course", "exam", "exams", "professor", "lecture", "lectures", "slide", "slides", "syllabus", "lab", "project",
+    "credits", "cfu", "grade", "teacher", "assignment", "nlp", "llm", "llms",
+}
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "to", "in", "on", "for", "and", "or", "what", "who",
+    "how", "why", "when", "where", "which", "do", "does", "did", "can", "could", "would", "should", "i", "you", "me",
+    "my", "it", "this", "that", "about", "with", "please", "tell", "explain", "there", "some", "any",
+}
+
+class RetrievalRouter:
+    '''
+    Decides locally whether a query needs retrieval, combining the similarity of the query embedding with the
+    corpus centroid and the overlap of the query terms with the corpus vocabulary.
+    Only queries whose score falls between the two thresholds are left to the LLM router.'''
+
+    def __init__(self, vector_store_manager):
+        self.vector_store_manager = vector_store_manager
+
+    def score(self, query):
+        """
+        Return the retrieval score of the query, between 0 and 1.
+        Small talk scores 0 and questions mentioning the course organisation score 1.
+        """
+        if SMALL_TALK_PATTERN.match(query):
+            return 0.0
+        terms = [term for term in tokenize(query) if term not in STOPWORDS]
+        if COURSE_KEYWORDS.intersection(terms):
+            return 1.0
+
+        manager = self.vector_store_manager
+        query_embedding = np.asarray(manager.embeddings.embed_query(query), dtype=np.float32)
+        # Similarity with the corpus centroid and fraction of the content words of the query that appear in the corpus
+        similarity, overlap = manager.routing_signals(terms, query_embedding)
+        # Rescale the centroid similarity so that ROUTER_CENTROID_FLOOR maps to 0 and ROUTER_CENTROID_CEILING to 1
+        floor, ceiling = cfg.ROUTER_CENTROID_FLOOR, cfg.ROUTER_CENTROID_CEILING
+        similarity = min(max((similarity - floor) / (ceiling - floor), 0.0), 1.0)
+
+        return cfg.ROUTER_CENTROID_WEIGHT * similarity + (1 - cfg.ROUTER_CENTROID_WEIGHT) * overlap
+
+    def route(self, query):
+        """Return RETRIEVE, RESPOND or AMBIGUOUS."""
+        score = self.score(query)
+        if score >= cfg.ROUTER_RETRIEVE_THRESHOLD:
+            return RETRIEVE
+        if score <= cfg.ROUTER_RESPOND_THRESHOLD:
+            return RESPOND
+        return AMBIGUOUS
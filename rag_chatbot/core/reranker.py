@@ -0,0 +1,100 @@
+import sys
+import os
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from config import Config as cfg
+
+# Rough token estimate, good enough to keep the prompt within budget without loading a tokenizer
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class Reranker:
+    '''
+    Rescores over-fetched candidates and keeps the best ones that fit the context token budget.
+    Uses a CPU cross-encoder when RERANK_MODEL is set, otherwise a cheap MMR relevance/diversity scorer.'''
+
+    def __init__(self, embeddings, model_name=cfg.RERANK_MODEL):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self._cross_encoder = None
+        self._lock = threading.Lock()
+
+    @property
+    def cross_encoder(self):
+        """Cross-encoder model, loaded on first use."""
+        if self._cross_encoder is None and self.model_name:
+            with self._lock:
+                if self._cross_encoder is None:
+                    from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+                    self._cross_encoder = HuggingFaceCrossEncoder(model_name=self.model_name, model_kwargs={"device": "cpu"})
+        return self._cross_encoder
+
+    @staticmethod
+    def _mmr(query_embedding, doc_embeddings, relevance=None, lambda_mult=cfg.MMR_LAMBDA):
+        """
+        Maximal marginal relevance order: each step picks the candidate with the best trade-off between its relevance
+        and its similarity to the candidates already picked. Relevance is the cosine similarity to the query if not given.
+        """
+        vectors = np.asarray(doc_embeddings, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if relevance is None:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            relevance = vectors @ (query / max(np.linalg.norm(query), 1e-12))
+        relevance = np.asarray(relevance, dtype=np.float32)
+        order = [int(np.argmax(relevance))]
+        redundancy = vectors @ vectors[order[0]]
+        while len(order) < len(vectors):
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+            scores[order] = -np.inf
+            best = int(np.argmax(scores))
+            order.append(best)
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+        return order
+
+    def _rank(self, query, query_embedding, docs, doc_embeddings=None, rank_relevance=False):
+        """Return the candidate indices, best first."""
+        if self.cross_encoder is not None:
+            scores = self.cross_encoder.score([(query, doc.page_content) for doc in docs])
+            return sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        if doc_embeddings is None:
+            doc_embeddings = self.embeddings.embed_documents([doc.page_content for doc in docs])
+        # A fused ranking is kept as the relevance term, from 1 for the first candidate down to 1/n for the last one
+        relevance = 1 - np.arange(len(docs)) / len(docs) if rank_relevance else None
+        return self._mmr(query_embedding, doc_embeddings, relevance)
+
+    def rerank(self, query, query_embedding, docs, k, token_budget=cfg.CONTEXT_TOKEN_BUDGET, doc_embeddings=None,
+               rank_relevance=False):
+        """
+        Keep the best k candidates whose total size fits the token budget.
+
+        Args:
+            query (str): The user query
+            query_embedding (list): The embedding of the query
+            docs (list): Candidate documents, in retrieval order
+            k (int): Maximum number of documents to keep
+            token_budget (int): Maximum estimated tokens of the kept documents (the best one is always kept)
+            doc_embeddings (np.ndarray): Vectors of the documents (embedded if None)
+            rank_relevance (bool): Use the retrieval order as relevance instead of the similarity to the query,
+                for rankings fused from several retrievers
+
+        Returns:
+            list: The kept documents, best first
+        """
+        if not docs:
+            return []
+        selected = []
+        used_tokens = 0
+        for i in self._rank(query, query_embedding, docs, doc_embeddings, rank_relevance):
+            tokens = estimate_tokens(docs[i].page_content)
+            if selected and used_tokens + tokens > token_budget:
+                continue
+            selected.append(docs[i])
+            used_tokens += tokens
+            if len(selected) == k:
+                break
+        return selected
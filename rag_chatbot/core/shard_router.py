@@ -0,0 +1,128 @@
+import sys
+import os
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from langchain_core.documents import Document
+from config import Config as cfg
+from core.vector_store import VectorStoreManager
+from core.sparse_index import tokenize, reciprocal_rank_fusion
+from core.reranker import Reranker
+
+class ShardedRetriever:
+    '''
+    Retrieves from several corpora (shards), each with its own vector store loaded on first use.
+    A query goes to the shards whose keywords it mentions, or else to the shards whose centroid is closest to the
+    query embedding; shards marked "always" (e.g. a shared syllabus) are searched for every query.
+    The rankings of the searched shards are fused and reranked together, so the cost of a search depends on the
+    shards it is routed to and not on how many corpora are served.'''
+
+    def __init__(self, corpora=None, max_shards=cfg.SHARD_ROUTING_MAX_SHARDS, margin=cfg.SHARD_ROUTING_MARGIN):
+        corpora = cfg.CORPORA if corpora is None else corpora
+        self.shards = {
+            name: VectorStoreManager(corpus["documents_path"], corpus["vector_store_path"])
+            for name, corpus in corpora.items()
+        }
+        self.keywords = {name: {keyword.lower() for keyword in corpus.get("keywords", [])} for name, corpus in corpora.items()}
+        self.always = [name for name, corpus in corpora.items() if corpus.get("always")]
+        self.max_shards = max_shards
+        self.margin = margin
+        self._reranker = None
+
+    @property
+    def embeddings(self):
+        return VectorStoreManager.shared_embeddings()
+
+    @property
+    def reranker(self):
+        if self._reranker is None:
+            self._reranker = Reranker(self.embeddings)
+        return self._reranker
+
+    @property
+    def build_id(self):
+        """Changes whenever the content of any shard changes."""
+        return "-".join(str(shard.stored_build_id()) for shard in self.shards.values())
+
+    def select(self, query, query_embedding, corpora=None):
+        """
+        Return the names of the shards to search.
+
+        Args:
+            query (str): The query
+            query_embedding (list): Embedding of the query
+            corpora (list): If given, search only these shards (and the "always" ones) instead of routing the query
+        """
+        if corpora is not None:
+            selected = [name for name in corpora if name in self.shards]
+        else:
+            terms = set(tokenize(query))
+            selected = [name for name, keywords in self.keywords.items() if keywords & terms and name not in self.always]
+            if not selected:
+                query_embedding = np.asarray(query_embedding, dtype=np.float32)
+                similarities = {}
+                for name, shard in self.shards.items():
+                    if name in self.always:
+                        continue
+                    centroid = shard.peek_centroid()
+                    similarities[name] = float(query_embedding @ centroid) if centroid is not None else -1.0
+                ranked = sorted(similarities, key=similarities.get, reverse=True)[:self.max_shards]
+                selected = [name for name in ranked if similarities[name] >= similarities[ranked[0]] - self.margin]
+        return selected + [name for name in self.always if name not in selected]
+
+    def routing_signals(self, terms, query_embedding):
+        """Return the best centroid similarity and vocabulary overlap among the shards the query is routed to."""
+        signals = [self.shards[name].routing_signals(terms, query_embedding)
+                   for name in self.select(" ".join(terms), query_embedding)]
+        if not signals:
+            return 0.0, 0.0
+        return max(similarity for similarity, _ in signals), max(overlap for _, overlap in signals)
+
+    def search(self, query, k=cfg.TOP_K, timings=None, corpora=None):
+        """
+        Retrieve the k most relevant chunks for the query from the shards it is routed to.
+        Each chunk is tagged with the name of its corpus in the "corpus" metadata key.
+        """
+        timings = {} if timings is None else timings
+
+        start = time.perf_counter()
+        query_embedding = self.embeddings.embed_query(query)
+        timings["embed_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        names = self.select(query, query_embedding, corpora)
+        timings["shard_routing_ms"] = (time.perf_counter() - start) * 1000
+
+        # Scores of different shards are not comparable: their candidate rankings are fused by rank
+        docs, vectors, rankings = {}, {}, []
+        for name in names:
+            shard_timings = {}
+            ranking = []
+            shard_docs, shard_vectors = self.shards[name].candidates(query, query_embedding, k, shard_timings)
+            for position, doc in enumerate(shard_docs):
+                # Tag a copy: in memory mode the document is the docstore's own
+                docs[(name, position)] = Document(id=doc.id, page_content=doc.page_content,
+                                                  metadata={**doc.metadata, "corpus": name})
+                vectors[(name, position)] = shard_vectors[position] if shard_vectors is not None else None
+                ranking.append((name, position))
+            rankings.append(ranking)
+            for stage, ms in shard_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + ms
+        keys = reciprocal_rank_fusion(rankings, [1.0] * len(rankings))[:max(k, cfg.RERANK_FETCH_K) if cfg.RERANK else k]
+        candidates = [docs[key] for key in keys]
+        if not cfg.RERANK:
+            return candidates
+
+        start = time.perf_counter()
+        candidate_vectors = np.vstack([vectors[key] for key in keys]) if keys and all(vectors[key] is not None for key in keys) else None
+        candidates = self.reranker.rerank(
+            query, query_embedding, candidates, k, doc_embeddings=candidate_vectors, rank_relevance=True
+        )
+        timings["rerank_ms"] = (time.perf_counter() - start) * 1000
+        return candidates
+
+def get_retriever():
+    """Return the retriever of the configured corpora: one vector store, or one shard per entry of CORPORA."""
+    return ShardedRetriever() if cfg.CORPORA else VectorStoreManager()
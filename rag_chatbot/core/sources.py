@@ -0,0 +1,43 @@
+import sys
+import os
+from pathlib import Path
+from typing import TypedDict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from config import Config as cfg
+
+# Metadata kept in the source records shown to the user
+SOURCE_METADATA_KEYS = ("source", "page", "total_pages", "Author", "corpus")
+
+class SourceRecord(TypedDict):
+    source: dict  # Compact chunk metadata (see SOURCE_METADATA_KEYS)
+    content: str
+
+def to_source_records(docs):
+    """Convert the retrieved documents (the retrieve tool artifact) to compact source records."""
+    return [
+        SourceRecord(
+            source={key: doc.metadata[key] for key in SOURCE_METADATA_KEYS if key in doc.metadata},
+            content=doc.page_content,
+        )
+        for doc in docs or []
+    ]
+
+def format_context(docs, template=cfg.CONTEXT_TEMPLATE):
+    """
+    Build the context string sent to the LLM from the retrieved documents.
+
+    Every document is formatted with the template (fields: index, name, page, content): the retrieval already kept
+    the ones that fit CONTEXT_TOKEN_BUDGET, and the sources shown to the user are the same documents.
+    """
+    parts = []
+    for i, doc in enumerate(docs, start=1):
+        page = doc.metadata.get("page")
+        parts.append(template.format(
+            index=i,
+            name=Path(doc.metadata.get("source", "unknown")).name,
+            page=page + 1 if isinstance(page, int) else "N/A",
+            content=doc.page_content,
+        ))
+    return "\n\n".join(parts)
@@ -0,0 +1,113 @@
+import sys
+import os
+import re
+import json
+import math
+import heapq
+from collections import Counter
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from config import Config as cfg
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text):
+    """Lowercase word tokens: exact terms such as acronyms and formula names are matched as they are."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    '''
+    Inverted index scoring chunks with BM25. Only the postings of the query terms are visited,
+    so a lookup costs a few dictionary scans regardless of the corpus size.'''
+
+    def __init__(self, k1=cfg.BM25_K1, b=cfg.BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = {}  # chunk ID -> {term: term frequency}
+        self.doc_lengths = {}
+        self.postings = {}  # term -> {chunk ID: term frequency}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, chunk_id, text):
+        self._add_terms(chunk_id, Counter(tokenize(text)))
+
+    def _add_terms(self, chunk_id, terms):
+        if chunk_id in self.doc_terms:
+            self.remove(chunk_id)
+        self.doc_terms[chunk_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[chunk_id] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def remove(self, chunk_id):
+        terms = self.doc_terms.pop(chunk_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(chunk_id)
+        for term in terms:
+            posting = self.postings[term]
+            del posting[chunk_id]
+            if not posting:
+                del self.postings[term]
+
+    def search(self, query, k):
+        """
+        Return the k best chunks for the query.
+
+        Returns:
+            list: (chunk ID, score) tuples sorted by decreasing score
+        """
+        n_docs = len(self.doc_terms)
+        if n_docs == 0:
+            return []
+        avg_length = self.total_length / n_docs
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path):
+        path = Path(path)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"k1": self.k1, "b": self.b, "docs": self.doc_terms}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        for chunk_id, terms in data["docs"].items():
+            index._add_terms(chunk_id, terms)
+        return index
+
+def reciprocal_rank_fusion(rankings, weights, k=cfg.RRF_K):
+    """
+    Fuse several rankings of chunk IDs with weighted reciprocal-rank fusion.
+
+    Args:
+        rankings (list): Lists of chunk IDs, best first
+        weights (list): Weight of each ranking
+
+    Returns:
+        list: Chunk IDs sorted by decreasing fused score
+    """
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,99 @@
+import sys
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from config import Config as cfg
+from core.telemetry import telemetry
+
+class SpeculativeRetrieval:
+    '''
+    Runs the retrieval of the user query in a background thread while the routing LLM call is in flight.
+    If the LLM then calls the retrieval tool with the same query, or one similar enough, the result is reused and
+    retrieval is off the critical path; otherwise it is discarded.
+    Speculations are keyed by the user query, so sessions asking the same question share one search.'''
+
+    def __init__(self, retriever, max_workers=cfg.SPECULATIVE_WORKERS, similarity=cfg.SPECULATIVE_SIMILARITY,
+                 ttl=cfg.SPECULATIVE_TTL):
+        self.retriever = retriever
+        self.similarity = similarity
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative-retrieval")
+        self._pending = {} # user query -> {"future", "timings", "waiters", "created"}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(query):
+        return " ".join(query.lower().split())
+
+    def _search(self, query, k, timings):
+        return self.retriever.search(query, k=k, timings=timings)
+
+    def start(self, query, k=cfg.TOP_K):
+        """Start retrieving the query in the background, unless the same query is already being retrieved."""
+        key = self._normalize(query)
+        with self._lock:
+            now = time.time()
+            # Speculations of turns that never reached the tool (e.g. failed LLM calls)
+            for expired in [q for q, entry in self._pending.items() if now - entry["created"] > self.ttl]:
+                self._pending.pop(expired)["future"].cancel()
+            entry = self._pending.get(key)
+            if entry is None:
+                timings = {}
+                entry = self._pending[key] = {
+                    "future": self._executor.submit(self._search, query, k, timings),
+                    "timings": timings, "waiters": 0, "created": now,
+                }
+            entry["waiters"] += 1
+
+    def _release(self, key):
+        """Drop one waiter of the speculation and return its entry. Must be called with the lock held."""
+        entry = self._pending.get(key)
+        if entry is None:
+            return None
+        entry["waiters"] -= 1
+        if entry["waiters"] <= 0:
+            del self._pending[key]
+        return entry
+
+    def take(self, user_query, tool_query):
+        """
+        Return the speculative result for the query the LLM asked for, or None if there is none or it is not similar.
+
+        Returns:
+            tuple: The retrieved documents and the stage timings of the search, or None
+        """
+        key = self._normalize(user_query)
+        with self._lock:
+            entry = self._release(key)
+        if entry is None:
+            return None
+
+        if self._normalize(tool_query) == key:
+            outcome = "hit"
+        else:
+            embeddings = self.retriever.embeddings
+            user_embedding = np.asarray(embeddings.embed_query(user_query), dtype=np.float32)
+            tool_embedding = np.asarray(embeddings.embed_query(tool_query), dtype=np.float32)
+            cosine = float(user_embedding @ tool_embedding /
+                           (np.linalg.norm(user_embedding) * np.linalg.norm(tool_embedding) or 1.0))
+            outcome = "similar" if cosine >= self.similarity else "miss"
+        telemetry.increment("speculative_retrieval_total", outcome=outcome)
+        if outcome == "miss":
+            if entry["waiters"] <= 0:
+                entry["future"].cancel()
+            return None
+        return entry["future"].result(), entry["timings"]
+
+    def discard(self, user_query):
+        """Give up the speculation of a query the LLM answered without retrieval."""
+        with self._lock:
+            entry = self._release(self._normalize(user_query))
+            if entry is not None and entry["waiters"] <= 0:
+                entry["future"].cancel()
+        if entry is not None:
+            telemetry.increment("speculative_retrieval_total", outcome="discarded")
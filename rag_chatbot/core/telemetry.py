@@ -0,0 +1,229 @@
+import sys
+import os
+import json
+import asyncio
+import time
+import uuid
+import bisect
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from config import Config as cfg
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ID of the request being served, shared by all its spans
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+logger = logging.getLogger("rag_chatbot.telemetry")
+
+class _Histogram:
+    '''
+    Cumulative latency histogram in the Prometheus format.'''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last bucket is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+class Telemetry:
+    '''
+    Process-wide latency histograms and counters.
+    Recording a span costs two clock reads and a dictionary update under a lock, so it can stay on in production;
+    every span is also written as a JSON log line when TELEMETRY_JSON_LOG is enabled.'''
+
+    def __init__(self, enabled=cfg.TELEMETRY, json_log=cfg.TELEMETRY_JSON_LOG, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.json_log = json_log
+        self.buckets = buckets
+        self._histograms = {} # (name, labels) -> _Histogram
+        self._counters = {} # (name, labels) -> value
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration in the histogram with the given name and labels."""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(seconds)
+        if self.json_log:
+            self.log(name, duration_ms=round(seconds * 1000, 3), **labels)
+
+    def increment(self, name, value=1, **labels):
+        """Increase the counter with the given name and labels."""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self.json_log:
+            self.log(name, value=value, **labels)
+
+    def log(self, event, **fields):
+        """Write a structured JSON log line, tagged with the current trace ID."""
+        logger.info(json.dumps({"ts": time.time(), "event": event, "trace_id": _trace_id.get(), **fields}, default=str))
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block and record it in the "<name>_seconds" histogram, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+    def timed(self, name, func, **labels):
+        """Wrap a sync or async function so that each call is recorded as a span."""
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+    @contextmanager
+    def trace(self):
+        """Assign a new trace ID to the spans recorded while serving one request."""
+        token = _trace_id.set(uuid.uuid4().hex)
+        try:
+            yield
+        finally:
+            try:
+                _trace_id.reset(token)
+            except ValueError:
+                pass # A stream finished in a different context than it started (e.g. another asyncio task)
+
+    def snapshot(self):
+        """Return count, mean and approximate p50/p99 (bucket upper bounds) of every histogram, and the counters."""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.total, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        def quantile(counts, count, q):
+            rank, seen = q * count, 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return bound
+            return float("inf")
+
+        def label_name(name, labels):
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        return {
+            "histograms": {
+                label_name(name, labels): {
+                    "count": count,
+                    "mean_ms": total / count * 1000 if count else 0.0,
+                    "p50_le_ms": quantile(counts, count, 0.5) * 1000,
+                    "p99_le_ms": quantile(counts, count, 0.99) * 1000,
+                }
+                for (name, labels), (counts, total, count) in histograms.items()
+            },
+            "counters": {label_name(name, labels): value for (name, labels), value in counters.items()},
+        }
+
+    def render_prometheus(self):
+        """Return all the metrics in the Prometheus text exposition format."""
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}" if pairs else ""
+
+        with self._lock:
+            histograms = sorted((key, list(h.counts), h.total, h.count) for key, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), counts, total, count in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE rag_{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"rag_{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"rag_{name}_sum{label_text(labels)} {total}")
+            lines.append(f"rag_{name}_count{label_text(labels)} {count}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE rag_{name} counter")
+                typed.add(name)
+            lines.append(f"rag_{name}{label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+# Shared by every module of the process
+telemetry = Telemetry()
+
+def configure_json_log(path=cfg.TELEMETRY_LOG_PATH):
+    """Send the JSON log lines to the given file, or to stderr if no path is given."""
+    if logger.handlers:
+        return
+    handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = telemetry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes are not worth a log line
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+def start_metrics_server(port=cfg.TELEMETRY_METRICS_PORT, host="0.0.0.0"):
+    """Serve /metrics in the Prometheus text format from a daemon thread. Calling it again is a no-op."""
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is None and port:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True, name="metrics-server").start()
+            print(f"Metrics available at http://{host}:{port}/metrics")
+    return _metrics_server
+
+if cfg.TELEMETRY_JSON_LOG:
+    configure_json_log()
@@ -1,120 +1,701 @@
 import sys
 import os
+import json
+import time
+import uuid
+import hashlib
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-from langchain_community.document_loaders import PDFPlumberLoader
+import faiss
+import numpy as np
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_mistralai import MistralAIEmbeddings
 from pathlib import Path
 from config import Config as cfg
+from core.embedding_cache import CachedEmbeddings
+from core.embedding_backends import load_embeddings, QueryBatcher, backend_agreement
+from core.chunk_store import SQLiteDocstore, write_chunk_store
+from core.sparse_index import BM25Index, reciprocal_rank_fusion
+from core.reranker import Reranker
+from core.chunking import chunk_documents
+from core.pdf_extraction import extract_pdf, extraction_context
+from core.faiss_index import (
+    index_params_from_config, build_params, build_index, configure_search, enable_reconstruct, mmap_io_flags,
+    reconstruct_vectors
+)
 
 class VectorStoreManager:
     '''
-    Singleton class that manages the vector store.'''
-    _instance = None # instance of the class
+    Class that manages the vector store of a corpus.
+    There is one instance per vector store path, so every corpus is loaded at most once per process.'''
+    _instances = {} # vector store path -> instance of the class
+    _instances_lock = threading.Lock()
+    _shared_embeddings = None # Embedding model shared by every corpus
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super(VectorStoreManager, cls).__new__(cls)
-            cls._instance._initialized = False  # Flag to check if the class has been initialized
-        return cls._instance
+    def __new__(cls, documents_path=cfg.DOCUMENTS_PATH, vector_store_path=cfg.VECTOR_STORE_PATH, *args, **kwargs):
+        key = str(Path(vector_store_path).resolve())
+        with cls._instances_lock:
+            if key not in cls._instances:
+                instance = super(VectorStoreManager, cls).__new__(cls)
+                instance._initialized = False  # Flag to check if the class has been initialized
+                cls._instances[key] = instance
+            return cls._instances[key]
 
-    def __init__(self, documents_path=cfg.DOCUMENTS_PATH, vector_store_path=cfg.VECTOR_STORE_PATH):
+    def __init__(self, documents_path=cfg.DOCUMENTS_PATH, vector_store_path=cfg.VECTOR_STORE_PATH, embeddings=None):
         if not self._initialized:
             self.documents_path = documents_path
             self.vector_store_path = vector_store_path
-            self.docs = []
-            self.chunks = []
             self.vector_store = None
-            # Mistral AI embeddings are norm 1 (cosine similarity, dot product or Euclidean distance are all equivalent).
-            # self.embeddings = MistralAIEmbeddings(model=cfg.MISTRAL_EMBEDDING_MODEL)
-            self.embeddings = HuggingFaceBgeEmbeddings(
-                model_name=cfg.HF_EMBEDDING_MODEL,
-                encode_kwargs={'normalize_embeddings': True}
-            )
+            self.sparse_index = None
+            self.build_id = None # Changes every time the index content changes
+            self.centroid = None # Normalized mean of the chunk vectors
+            self._reranker = None
+            self._chunk_positions = None # chunk ID -> FAISS position, built on first use in memory mode
+            self._embeddings = embeddings # Configured embedding model if None
+            self._lock = threading.RLock()
             self._initialized = True  # Set the flag to True
 
-    def _load_documents(self):
-        pdf_files = list(Path(self.documents_path).glob('*.pdf'))
-        for pdf_file in pdf_files:
-            filename = pdf_file.name
-            # We will esclude the first and the last page only for the slides
-            try:
-                # Check if the filename starts with a number
-                starts_with_number = filename[0].isdigit()
-                
-                if starts_with_number:
-                    # For documents starting with a number, load and skip first and last page
-                    import pdfplumber  # Import here to avoid circular imports
-                    
-                    # First, count the total pages
-                    with pdfplumber.open(str(pdf_file)) as pdf:
-                        total_pages = len(pdf.pages)
-                        if total_pages <= 2:  # Not enough pages to skip first and last
-                            print(f"Warning: {filename} has only {total_pages} pages, need at least 3 to skip first and last. Loading all pages.")
-                            loader = PDFPlumberLoader(str(pdf_file))
-                            self.docs.extend(loader.load())
-                        else:
-                            # Create a custom loader for specific pages (skip first and last)
-                            pages = []
-                            with pdfplumber.open(str(pdf_file)) as pdf:
-                                for i in range(1, total_pages - 1):  # Skip page 0 and the last page
-                                    page = pdf.pages[i]
-                                    text = page.extract_text()
-                                    # Create a Document object similar to what PDFPlumberLoader would create
-                                    from langchain_core.documents import Document
-                                    doc = Document(
-                                        page_content=text,
-                                        metadata={
-                                            "source": str(pdf_file),
-                                            "page": i,
-                                            "total_pages": total_pages
-                                        }
-                                    )
-                                    pages.append(doc)
-                            self.docs.extend(pages)
-                            print(f"Loaded {filename} - skipped first and last pages ({len(pages)} pages loaded)")
-                else:
-                    # For other documents, load all pages
-                    loader = PDFPlumberLoader(str(pdf_file))
-                    loaded_docs = loader.load()
-                    self.docs.extend(loaded_docs)
-                    print(f"Loaded {filename} - all pages ({len(loaded_docs)} pages loaded)")
-                    
-            except Exception as e:
-                print(f"Error loading {pdf_file}: {e}")
-        
-        print(f"Successfully loaded {len(self.docs)} documents.")
-
-    def _split_documents(self):
-        """Split documents into chunks and filter out chunks that are too short."""
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=cfg.CHUNK_SIZE, chunk_overlap=cfg.CHUNK_OVERLAP)
-        all_chunks = text_splitter.split_documents(self.docs)
-        
+    @classmethod
+    def shared_embeddings(cls):
+        """Configured embedding model, loaded on first use and shared by every corpus."""
+        if cls._shared_embeddings is None:
+            with cls._instances_lock:
+                if cls._shared_embeddings is None:
+                    # Mistral AI embeddings are norm 1 (cosine similarity, dot product or Euclidean distance are all equivalent).
+                    # embeddings = MistralAIEmbeddings(model=cfg.MISTRAL_EMBEDDING_MODEL)
+                    embeddings = load_embeddings()
+                    if cfg.EMBEDDING_QUERY_BATCH_SIZE > 1:
+                        embeddings = QueryBatcher(embeddings)
+                    # Unchanged chunks and repeated queries are served from the embedding cache.
+                    # Vectors of different backends are cached separately (the reference keeps the plain model name)
+                    model_name = cfg.HF_EMBEDDING_MODEL
+                    if cfg.EMBEDDING_BACKEND != "torch":
+                        model_name += f"#{cfg.EMBEDDING_BACKEND}"
+                    cls._shared_embeddings = CachedEmbeddings(
+                        embeddings,
+                        model_name=model_name,
+                        cache_path=cfg.EMBEDDING_CACHE_PATH,
+                        max_memory_items=cfg.EMBEDDING_CACHE_MEMORY_ITEMS
+                    )
+        return cls._shared_embeddings
+
+    @property
+    def embeddings(self):
+        """Embedding model, loaded on first use."""
+        if self._embeddings is None:
+            self._embeddings = self.shared_embeddings()
+        return self._embeddings
+
+    @property
+    def reranker(self):
+        if self._reranker is None:
+            self._reranker = Reranker(self.embeddings)
+        return self._reranker
+
+    def get_vector_store(self):
+        """Return the vector store, loading (or generating) it on first use."""
+        if self.vector_store is None:
+            with self._lock:
+                if self.vector_store is None:
+                    self.load_or_generate_vector_store()
+        return self.vector_store
+
+    def _list_pdf_files(self):
+        return sorted(Path(self.documents_path).glob('*.pdf'))
+
+    @staticmethod
+    def _hash_file(path, block_size=1 << 20):
+        """Return the SHA-256 digest of the file content."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _index_settings():
+        """
+        Settings that invalidate every indexed chunk when they change.
+        The embedding backend is not one of them: a new backend is validated against the index instead.
+        """
+        return {
+            "embedding_model": cfg.HF_EMBEDDING_MODEL,
+            "chunk_size": cfg.CHUNK_SIZE,
+            "chunk_overlap": cfg.CHUNK_OVERLAP,
+            "min_chunk_length": cfg.MIN_CHUNK_LENGTH,
+            "layout_aware_chunking": cfg.LAYOUT_AWARE_CHUNKING,
+            "boilerplate_edge_lines": cfg.BOILERPLATE_EDGE_LINES if cfg.LAYOUT_AWARE_CHUNKING else None,
+            "boilerplate_min_fraction": cfg.BOILERPLATE_MIN_FRACTION if cfg.LAYOUT_AWARE_CHUNKING else None,
+            "near_duplicate_distance": cfg.NEAR_DUPLICATE_DISTANCE if cfg.LAYOUT_AWARE_CHUNKING else None,
+        }
+
+    def _manifest_path(self):
+        return Path(self.vector_store_path) / cfg.VECTOR_STORE_MANIFEST
+
+    def _read_manifest(self):
+        manifest_path = self._manifest_path()
+        if not manifest_path.exists():
+            return None
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_manifest(self, files, complete=True):
+        """Atomically write the manifest of indexed files (content hash and chunk IDs per file)."""
+        # A new build ID marks every change of the index content
+        manifest = {
+            "settings": self._index_settings(), "embedding_backend": cfg.EMBEDDING_BACKEND,
+            "build_id": uuid.uuid4().hex, "complete": complete, "files": files,
+        }
+        self._save_manifest(manifest)
+
+    def _save_manifest(self, manifest):
+        manifest_path = self._manifest_path()
+        tmp_path = manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def _load_documents(self, pdf_files=None):
+        """
+        Extract the PDFs in a process pool and stream their pages file by file.
+
+        Yields:
+            tuple: The source of each file and its Document objects (None if extraction failed),
+                in the order of pdf_files
+        """
+        if pdf_files is None:
+            pdf_files = self._list_pdf_files()
+        pdf_files = [str(pdf_file) for pdf_file in pdf_files]
+        workers = min(cfg.EXTRACTION_WORKERS or os.cpu_count() or 1, len(pdf_files))
+
+        start = time.perf_counter()
+        total_pages = 0
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=extraction_context()) as executor:
+                results = self._extract_in_order(executor, pdf_files, 2 * workers)
+                for source, docs in self._collect_extraction_results(results):
+                    total_pages += len(docs or [])
+                    yield source, docs
+        else:
+            for source, docs in self._collect_extraction_results(map(extract_pdf, pdf_files)):
+                total_pages += len(docs or [])
+                yield source, docs
+
+        print(f"Successfully loaded {total_pages} documents from {len(pdf_files)} files "
+              f"in {time.perf_counter() - start:.2f}s ({workers} workers).")
+
+    @staticmethod
+    def _extract_in_order(executor, pdf_files, max_in_flight):
+        """
+        Extract the files in the executor and yield the results in the order of pdf_files, so that the stream is
+        deterministic. At most max_in_flight files are submitted at a time: extraction is faster than embedding,
+        and the pages of the whole corpus would otherwise pile up in finished futures.
+        """
+        pdf_files = iter(pdf_files)
+        pending = deque(executor.submit(extract_pdf, pdf_file) for pdf_file in itertools.islice(pdf_files, max_in_flight))
+        while pending:
+            future = pending.popleft()
+            # Refill before handing the result over, so that the workers keep extracting while it is embedded
+            for pdf_file in itertools.islice(pdf_files, 1):
+                pending.append(executor.submit(extract_pdf, pdf_file))
+            yield future.result()
+
+    @staticmethod
+    def _collect_extraction_results(results):
+        """Report the outcome of each extraction and convert the extracted pages to Document objects."""
+        for result in results:
+            filename = Path(result["source"]).name
+            if result["error"] is not None:
+                print(f"Error loading {result['source']}: {result['error']}")
+                yield result["source"], None
+                continue
+            if result["warning"] is not None:
+                print(f"Warning: {result['warning']}")
+            docs = [Document(page_content=text, metadata=metadata) for text, metadata in result["pages"]]
+            print(f"Loaded {filename} - {result['mode']} ({len(docs)} pages loaded) in {result['elapsed']:.2f}s")
+            yield result["source"], docs
+
+    @staticmethod
+    def _split_documents(docs, text_splitter, stats):
+        """Split the pages of a file into chunks and filter out chunks that are too short."""
+        if cfg.LAYOUT_AWARE_CHUNKING:
+            return chunk_documents(docs, text_splitter, stats)
+        chunks = text_splitter.split_documents(docs)
+        stats["pages"] += len(docs)
+        stats["chunks"] += len(chunks)
         # Filter chunks by minimum length
-        self.chunks = [chunk for chunk in all_chunks if len(chunk.page_content.strip()) >= cfg.MIN_CHUNK_LENGTH]
-        
-        print(f'Before split: {len(self.docs)} pages, after split: {len(all_chunks)} chunks.')
-        print(f'After length filtering: {len(self.chunks)} chunks (minimum {cfg.MIN_CHUNK_LENGTH} characters).')
+        chunks = [chunk for chunk in chunks if len(chunk.page_content.strip()) >= cfg.MIN_CHUNK_LENGTH]
+        stats["kept"] += len(chunks)
+        return chunks
+
+    def _add_chunks(self, chunks, ids):
+        """Embed the chunks in batches of EMBEDDING_BATCH_SIZE and append them to the index."""
+        batch_size = cfg.EMBEDDING_BATCH_SIZE
+        for i in range(0, len(chunks), batch_size):
+            batch, batch_ids = chunks[i:i + batch_size], ids[i:i + batch_size]
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_documents(batch, self.embeddings, ids=batch_ids)
+            else:
+                self.vector_store.add_documents(batch, ids=batch_ids)
+        return len(chunks)
+
+    def _save_vector_store(self, files, complete=True):
+        if self.vector_store is None:
+            print('Warning: no chunks were indexed, nothing to save.')
+            return
+        self.vector_store.save_local(self.vector_store_path)
+        self.sparse_index.save(self._sparse_index_path())
+        if complete:
+            # Checkpoints skip the chunk store: it is only read once the build is complete
+            write_chunk_store(self._chunk_store_path(), self.vector_store)
+        self._write_manifest(files, complete=complete)
+
+    def _index_files(self, file_hashes, files):
+        """
+        Stream the files through extraction, splitting and embedding, appending the chunks to the index in batches.
+
+        Progress is checkpointed every BUILD_CHECKPOINT_INTERVAL chunks: a file is recorded in the manifest only once
+        all its chunks are in the saved index, so an interrupted build resumes from the first file that was not saved.
+        Pages and chunks are released as soon as they have been embedded.
+
+        Args:
+            file_hashes (dict): Content hash of each file to index
+            files (dict): Manifest entries of the files already in the index, updated in place
+
+        Returns:
+            int: The number of chunks added to the index
+        """
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=cfg.CHUNK_SIZE, chunk_overlap=cfg.CHUNK_OVERLAP)
+        stats = {"pages": 0, "chunks": 0, "kept": 0, "boilerplate_lines": 0, "merged_pages": 0, "duplicates": 0}
+        batch_chunks, batch_ids, pending_files = [], [], []
+        added = 0
+        since_checkpoint = 0
+        for source, docs in self._load_documents(list(file_hashes)):
+            if docs is None:
+                continue  # Not recorded in the manifest, so it is retried at the next update
+            chunks = self._split_documents(docs, text_splitter, stats)
+            file_hash = file_hashes[source]
+            # Identical files under different names must not share chunk IDs
+            prefix = hashlib.sha256(f"{source}\0{file_hash}".encode("utf-8")).hexdigest()[:16]
+            entry = {"hash": file_hash, "chunk_ids": [f'{prefix}-{i}' for i in range(len(chunks))]}
+            batch_chunks.extend(chunks)
+            batch_ids.extend(entry["chunk_ids"])
+            pending_files.append((source, entry))
+            for chunk_id, chunk in zip(entry["chunk_ids"], chunks):
+                self.sparse_index.add(chunk_id, chunk.page_content)
+
+            if len(batch_chunks) >= cfg.EMBEDDING_BATCH_SIZE:
+                since_checkpoint += self._add_chunks(batch_chunks, batch_ids)
+                files.update(pending_files)
+                batch_chunks, batch_ids, pending_files = [], [], []
+                if since_checkpoint >= cfg.BUILD_CHECKPOINT_INTERVAL:
+                    self._save_vector_store(files, complete=False)
+                    added += since_checkpoint
+                    since_checkpoint = 0
+                    print(f'Checkpoint saved: {added} chunks indexed so far.')
+
+        since_checkpoint += self._add_chunks(batch_chunks, batch_ids)
+        files.update(pending_files)
+        added += since_checkpoint
+
+        if cfg.LAYOUT_AWARE_CHUNKING:
+            print(f'Layout-aware chunking: {stats["boilerplate_lines"]} header/footer lines stripped, '
+                  f'{stats["pages"]} pages merged into {stats["merged_pages"]}.')
+        print(f'Before split: {stats["pages"]} pages, after split: {stats["chunks"]} chunks.')
+        print(f'After length filtering: {stats["kept"] + stats["duplicates"]} chunks (minimum {cfg.MIN_CHUNK_LENGTH} characters).')
+        if cfg.LAYOUT_AWARE_CHUNKING:
+            print(f'After deduplication: {stats["kept"]} chunks ({stats["duplicates"]} exact or near duplicates dropped).')
+        return added
+
+    def _chunk_store_path(self):
+        return Path(self.vector_store_path) / cfg.CHUNK_STORE_FILENAME
+
+    def _sparse_index_path(self):
+        return Path(self.vector_store_path) / cfg.SPARSE_INDEX_FILENAME
+
+    def _load_sparse_index(self):
+        """Load the BM25 index saved with the vector store, building it from the docstore if it is missing."""
+        if self._sparse_index_path().exists():
+            self.sparse_index = BM25Index.load(self._sparse_index_path())
+            return
+        print('Sparse index not found. Building it from the docstore...')
+        self.sparse_index = BM25Index()
+        for chunk_id in self.vector_store.index_to_docstore_id.values():
+            self.sparse_index.add(chunk_id, self.vector_store.docstore.search(chunk_id).page_content)
+        self.sparse_index.save(self._sparse_index_path())
+
+    def _needs_update(self):
+        """Check, without loading the vector store, whether it must be resumed or updated."""
+        manifest = self._read_manifest()
+        if manifest is not None and not manifest.get("complete", True):
+            return True
+        if not cfg.INCREMENTAL_INDEXING:
+            return False
+        current = {str(pdf_file): self._hash_file(pdf_file) for pdf_file in self._list_pdf_files()}
+        if not current:
+            return False
+        if manifest is None or manifest["settings"] != self._index_settings():
+            return True
+        return {source: entry["hash"] for source, entry in manifest["files"].items()} != current
+
+    def _load_mmap_vector_store(self):
+        """
+        Open the vector store without reading it into memory: the FAISS index is memory-mapped
+        and chunks are fetched from the on-disk chunk store only for the search hits.
+        """
+        index = faiss.read_index(str(Path(self.vector_store_path) / "index.faiss"), mmap_io_flags("flat"))
+        docstore = SQLiteDocstore(self._chunk_store_path())
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=docstore.index_to_docstore_id()
+        )
+
+    def _embedding_backend_agrees(self):
+        """
+        Check an index embedded with another backend against the configured one, before it is loaded or updated.
+        If they agree, the index is kept and the manifest records the configured backend (with the same build ID,
+        so that the centroid, the approximate index and the cached answers stay valid).
+
+        Returns:
+            bool: False if every chunk must be re-embedded with the configured backend
+        """
+        manifest = self._read_manifest()
+        # Indexes built before backends were recorded were embedded by the reference PyTorch model
+        stored_backend = (manifest or {}).get("embedding_backend", "torch")
+        if manifest is None or stored_backend == cfg.EMBEDDING_BACKEND:
+            return True
+
+        print(f'Validating the {cfg.EMBEDDING_BACKEND} embedding backend against the index embedded with {stored_backend}...')
+        if self._chunk_store_path().exists():
+            vector_store = self._load_mmap_vector_store()
+        else:
+            vector_store = FAISS.load_local(self.vector_store_path, self.embeddings, allow_dangerous_deserialization=True)
+        agreement = backend_agreement(self.embeddings, vector_store)
+        print(f'Cosine agreement on {agreement["samples"]} chunks: mean {agreement["mean"]:.4f}, min {agreement["min"]:.4f}')
+        if agreement["mean"] < cfg.EMBEDDING_BACKEND_MIN_AGREEMENT:
+            return False
+
+        manifest["embedding_backend"] = cfg.EMBEDDING_BACKEND
+        manifest["embedding_agreement"] = {"reference": stored_backend, **agreement}
+        self._save_manifest(manifest)
+        return True
 
     def load_or_generate_vector_store(self):
-        if Path(self.vector_store_path).exists():
-            print(f'Loading existing vector store from {self.vector_store_path}')
-            self.vector_store = FAISS.load_local(self.vector_store_path, self.embeddings, allow_dangerous_deserialization=True)
-            print(f'Vector store successfully loaded from {self.vector_store_path}')
+        mmap = cfg.VECTOR_STORE_LOAD_MODE == "mmap"
+        if Path(self.vector_store_path).exists() and not self._embedding_backend_agrees():
+            print(f'The agreement is below {cfg.EMBEDDING_BACKEND_MIN_AGREEMENT}. Re-embedding all documents...')
+            self._generate_vector_store()
+        elif Path(self.vector_store_path).exists():
+            if self._needs_update() or (mmap and not self._chunk_store_path().exists()):
+                print(f'Loading existing vector store from {self.vector_store_path}')
+                self.vector_store = FAISS.load_local(self.vector_store_path, self.embeddings, allow_dangerous_deserialization=True)
+                print(f'Vector store successfully loaded from {self.vector_store_path}')
+                self._load_sparse_index()
+                manifest = self._read_manifest()
+                if manifest is not None and not manifest.get("complete", True):
+                    print('The last build was interrupted. Resuming...')
+                    self._update_vector_store()
+                elif cfg.INCREMENTAL_INDEXING:
+                    self._update_vector_store()
+                if not self._chunk_store_path().exists():
+                    write_chunk_store(self._chunk_store_path(), self.vector_store)
+            elif not mmap:
+                print(f'Loading existing vector store from {self.vector_store_path}')
+                self.vector_store = FAISS.load_local(self.vector_store_path, self.embeddings, allow_dangerous_deserialization=True)
+                print(f'Vector store successfully loaded from {self.vector_store_path}')
         else:
             print('Vector store not found. Generating new one...')
-            self._load_documents()
-            self._split_documents()
             self._generate_vector_store()
+        if mmap and (Path(self.vector_store_path) / "index.faiss").exists():
+            # Release the in-memory copy used for building or updating
+            self.vector_store = self._load_mmap_vector_store()
+            print(f'Vector store memory-mapped from {self.vector_store_path}')
+        # The local query router scores the vocabulary overlap with the BM25 postings, also in dense retrieval mode
+        needs_sparse_index = cfg.RETRIEVAL_MODE == "hybrid" or cfg.ROUTING_MODE == "local"
+        if needs_sparse_index and self.vector_store is not None and self.sparse_index is None:
+            self._load_sparse_index()
+        self.build_id = (self._read_manifest() or {}).get("build_id")
+        self._chunk_positions = None
+        if self.vector_store is not None:
+            self._load_centroid()
+        self._attach_ann_index()
 
     def _generate_vector_store(self):
-        self.vector_store = FAISS.from_documents(self.chunks, self.embeddings)
-        self.vector_store.save_local(self.vector_store_path)
-        print(f'Vector store saved to {self.vector_store_path}')
+        start = time.perf_counter()
+        file_hashes = {str(pdf_file): self._hash_file(pdf_file) for pdf_file in self._list_pdf_files()}
+        self.vector_store = None
+        self.sparse_index = BM25Index()
+        files = {}
+        self._index_files(file_hashes, files)
+        self._save_vector_store(files)
+        print(f'Vector store saved to {self.vector_store_path} in {time.perf_counter() - start:.2f}s')
+
+    def search(self, query, k=cfg.TOP_K, timings=None):
+        """
+        Retrieve the k most relevant chunks for the query.
+
+        In "hybrid" retrieval mode the FAISS and BM25 rankings are fused with weighted reciprocal-rank fusion,
+        so that exact terms (slide titles, acronyms, formula names) are found even when the dense ranking misses them.
+        With RERANK enabled, RERANK_FETCH_K candidates are rescored and only the best ones fitting
+        CONTEXT_TOKEN_BUDGET are kept.
+
+        Args:
+            query (str): The query
+            k (int): Maximum number of chunks to return
+            timings (dict): If given, filled with the duration in milliseconds of each stage
+        """
+        timings = {} if timings is None else timings
+        self.get_vector_store()
+
+        start = time.perf_counter()
+        query_embedding = self.embeddings.embed_query(query) # Repeated queries hit the embedding cache
+        timings["embed_ms"] = (time.perf_counter() - start) * 1000
+
+        docs, vectors = self.candidates(query, query_embedding, k, timings)
+        if not cfg.RERANK:
+            return docs
+
+        start = time.perf_counter()
+        # A fused ranking is more relevant than the similarity to the query alone: it includes exact term matches
+        hybrid = cfg.RETRIEVAL_MODE == "hybrid" and self.sparse_index is not None
+        docs = self.reranker.rerank(query, query_embedding, docs, k, doc_embeddings=vectors, rank_relevance=hybrid)
+        timings["rerank_ms"] = (time.perf_counter() - start) * 1000
+        return docs
+
+    def candidates(self, query, query_embedding, k=cfg.TOP_K, timings=None):
+        """
+        Return the ranked candidates of the query before reranking: k chunks, or RERANK_FETCH_K with RERANK enabled.
+
+        Returns:
+            tuple: The candidate documents, best first, and their vectors as stored in the index (None if the index
+            cannot return them)
+        """
+        timings = {} if timings is None else timings
+        vector_store = self.get_vector_store()
+        hybrid = cfg.RETRIEVAL_MODE == "hybrid" and self.sparse_index is not None
+        candidates_k = max(k, cfg.RERANK_FETCH_K) if cfg.RERANK else k
+        fetch_k = max(candidates_k, cfg.HYBRID_FETCH_K) if hybrid else candidates_k
+
+        start = time.perf_counter()
+        _, positions = vector_store.index.search(np.array([query_embedding], dtype=np.float32), fetch_k)
+        positions = {vector_store.index_to_docstore_id[int(i)]: int(i) for i in positions[0] if i != -1}
+        ranking = list(positions)
+        timings["dense_search_ms"] = (time.perf_counter() - start) * 1000
+        if hybrid:
+            start = time.perf_counter()
+            sparse_ranking = [chunk_id for chunk_id, _ in self.sparse_index.search(query, fetch_k)]
+            ranking = reciprocal_rank_fusion(
+                [ranking, sparse_ranking], [1 - cfg.HYBRID_SPARSE_WEIGHT, cfg.HYBRID_SPARSE_WEIGHT]
+            )
+            timings["sparse_search_ms"] = (time.perf_counter() - start) * 1000
+
+        # Chunk text is fetched only for the candidates
+        start = time.perf_counter()
+        hits = [(chunk_id, vector_store.docstore.search(chunk_id)) for chunk_id in ranking[:candidates_k]]
+        # The docstore returns an error string for unknown IDs (e.g. BM25 entries of chunks never embedded)
+        hits = [(chunk_id, doc) for chunk_id, doc in hits if isinstance(doc, Document)]
+        ranking = [chunk_id for chunk_id, _ in hits]
+        docs = [doc for _, doc in hits]
+        vectors = self._stored_vectors(ranking, positions)
+        timings["fetch_ms"] = (time.perf_counter() - start) * 1000
+        return docs, vectors
+
+    def _stored_vectors(self, chunk_ids, positions):
+        """
+        Read the vectors of the chunks back from the index, so that reranking never re-embeds them.
+        `positions` holds the FAISS positions already known (the dense hits); the others are looked up.
+        """
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in positions]
+        if missing:
+            docstore = self.vector_store.docstore
+            if isinstance(docstore, SQLiteDocstore):
+                positions = {**positions, **docstore.positions(missing)}
+            else:
+                if self._chunk_positions is None:
+                    self._chunk_positions = {chunk_id: position for position, chunk_id in self.vector_store.index_to_docstore_id.items()}
+                positions = {**positions, **{chunk_id: self._chunk_positions[chunk_id] for chunk_id in missing
+                                             if chunk_id in self._chunk_positions}}
+        if not chunk_ids or any(chunk_id not in positions for chunk_id in chunk_ids):
+            return None
+        try:
+            return np.vstack([self.vector_store.index.reconstruct(positions[chunk_id]) for chunk_id in chunk_ids])
+        except RuntimeError:
+            return None
+
+    def routing_signals(self, terms, query_embedding):
+        """Return the similarity of the query embedding with the corpus centroid and the fraction of terms in the corpus."""
+        self.get_vector_store()
+        vocabulary = self.sparse_index.postings if self.sparse_index is not None else {}
+        overlap = sum(term in vocabulary for term in terms) / len(terms) if terms else 0.0
+        similarity = float(np.asarray(query_embedding, dtype=np.float32) @ self.centroid) if self.centroid is not None else 0.0
+        return similarity, overlap
+
+    def peek_centroid(self):
+        """Return the corpus centroid, reading it from disk without loading the vector store when possible."""
+        if self.centroid is None:
+            centroid_path = Path(self.vector_store_path) / cfg.CENTROID_FILENAME
+            manifest = self._read_manifest()
+            if centroid_path.exists() and manifest is not None:
+                with open(centroid_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data["build_id"] == manifest.get("build_id"):
+                    self.centroid = np.array(data["centroid"], dtype=np.float32)
+        if self.centroid is None:
+            self.get_vector_store()
+        return self.centroid
+
+    def stored_build_id(self):
+        """Build ID of the vector store, read from the manifest if the store is not loaded."""
+        return self.build_id or (self._read_manifest() or {}).get("build_id")
+
+    def _load_centroid(self):
+        """Load the corpus centroid saved for the current build, computing it from the flat index if needed."""
+        centroid_path = Path(self.vector_store_path) / cfg.CENTROID_FILENAME
+        if centroid_path.exists():
+            with open(centroid_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data["build_id"] == self.build_id:
+                self.centroid = np.array(data["centroid"], dtype=np.float32)
+                return
+        vectors = reconstruct_vectors(self.vector_store.index)
+        if len(vectors) == 0:
+            return
+        centroid = vectors.mean(axis=0)
+        self.centroid = centroid / np.linalg.norm(centroid)
+        # Other workers may read the file meanwhile: it is replaced atomically, and their temporary files are distinct
+        tmp_path = centroid_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"build_id": self.build_id, "centroid": self.centroid.tolist()}, f)
+        os.replace(tmp_path, centroid_path)
+
+    def _ann_index_paths(self):
+        index_dir = Path(self.vector_store_path)
+        return index_dir / f"index.{cfg.FAISS_INDEX_TYPE}.faiss", index_dir / f"index.{cfg.FAISS_INDEX_TYPE}.json"
+
+    def _attach_ann_index(self):
+        """
+        Replace the flat index with the approximate index selected by FAISS_INDEX_TYPE.
+
+        The flat index saved with the store stays the source of truth for incremental updates: the approximate index
+        is trained from its vectors and persisted next to it, and retrained only when the store or the build
+        parameters change.
+        """
+        index_type, params = index_params_from_config()
+        if index_type == "flat" or self.vector_store is None:
+            return
+        manifest = self._read_manifest() or {}
+        fingerprint = {
+            "type": index_type,
+            "params": build_params(index_type, params),
+            "build_id": manifest.get("build_id"),
+            "ntotal": self.vector_store.index.ntotal,
+        }
+        index_path, fingerprint_path = self._ann_index_paths()
+
+        stored_fingerprint = None
+        if index_path.exists() and fingerprint_path.exists():
+            with open(fingerprint_path, 'r', encoding='utf-8') as f:
+                stored_fingerprint = json.load(f)
+
+        if stored_fingerprint == fingerprint:
+            io_flags = mmap_io_flags(index_type) if cfg.VECTOR_STORE_LOAD_MODE == "mmap" else 0
+            index = faiss.read_index(str(index_path), io_flags)
+            configure_search(index, params)
+            print(f'Loaded {index_type} index from {index_path}')
+        else:
+            print(f'Training {index_type} index on {fingerprint["ntotal"]} vectors...')
+            start = time.perf_counter()
+            try:
+                index = build_index(reconstruct_vectors(self.vector_store.index), index_type, params)
+            except ValueError as e:
+                print(f'Warning: could not build the {index_type} index ({e}). Using the flat index.')
+                return
+            # Workers starting meanwhile may read the files: they are replaced atomically, the index first, so that
+            # a fingerprint always describes the index next to it
+            tmp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+            faiss.write_index(index, str(tmp_path))
+            os.replace(tmp_path, index_path)
+            tmp_path = fingerprint_path.with_name(f'{fingerprint_path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(fingerprint, f, indent=2)
+            os.replace(tmp_path, fingerprint_path)
+            print(f'{index_type} index trained and saved to {index_path} in {time.perf_counter() - start:.2f}s')
+        # The reranker reads the candidate vectors back from the index
+        enable_reconstruct(index)
+        self.vector_store.index = index
+
+    def _bootstrap_manifest(self):
+        """
+        Build the manifest of a vector store generated before manifests existed.
+        The store content is trusted to match the current version of the files it references.
+        """
+        files = {}
+        for doc_id in self.vector_store.index_to_docstore_id.values():
+            doc = self.vector_store.docstore.search(doc_id)
+            source = doc.metadata.get("source") if hasattr(doc, "metadata") else None
+            files.setdefault(source, {"hash": None, "chunk_ids": []})["chunk_ids"].append(doc_id)
+        for source, entry in files.items():
+            if source is not None and Path(source).exists():
+                entry["hash"] = self._hash_file(source)
+        return {"settings": self._index_settings(), "files": files}
+
+    def _update_vector_store(self):
+        """Re-index only the PDFs added, changed or removed since the last build, and finish interrupted builds."""
+        current = {str(pdf_file): self._hash_file(pdf_file) for pdf_file in self._list_pdf_files()}
+        if not current:
+            # Never wipe the index because the corpus is not available on this machine
+            print(f'Warning: no documents found in {self.documents_path}. Using the existing vector store as is.')
+            return
+
+        manifest = self._read_manifest()
+        bootstrapped = manifest is None
+        if bootstrapped:
+            print('Vector store manifest not found. Building it from the docstore...')
+            manifest = self._bootstrap_manifest()
+        indexed = manifest["files"]
+
+        if manifest["settings"] != self._index_settings():
+            print('Index settings changed since the last build. Re-indexing all documents...')
+            stale = list(indexed)
+            to_index = list(current)
+        else:
+            stale = [source for source, entry in indexed.items() if current.get(source) != entry["hash"]]
+            to_index = [source for source, file_hash in current.items()
+                        if source not in indexed or indexed[source]["hash"] != file_hash]
+
+        # Chunks not referenced by the manifest were saved by a build interrupted between checkpoints
+        files = {source: entry for source, entry in indexed.items() if source not in stale}
+        kept_ids = {chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]}
+        stale_ids = [doc_id for doc_id in self.vector_store.index_to_docstore_id.values() if doc_id not in kept_ids]
+        # BM25 entries are added before their chunks are embedded: an interrupted build can leave some without vectors
+        sparse_orphans = [chunk_id for chunk_id in self.sparse_index.doc_terms if chunk_id not in kept_ids]
+
+        if not stale_ids and not sparse_orphans and not to_index and manifest.get("complete", True):
+            print('Vector store is up to date.')
+            if bootstrapped:
+                self._write_manifest(files)
+            return
+        print(f'Incremental update: {len(stale)} stale files, {len(to_index)} files to index.')
+
+        # Delete the vectors of removed or changed files through the docstore
+        if stale_ids:
+            self.vector_store.delete(stale_ids)
+        for chunk_id in sparse_orphans:
+            self.sparse_index.remove(chunk_id)
+
+        # Embed only new or changed files
+        added = self._index_files({source: current[source] for source in to_index}, files)
+        self._save_vector_store(files)
+        print(f'Vector store updated: {len(stale_ids)} chunks removed, {added} chunks added.')
 
 # # Example usage:
 # if __name__ == "__main__":
@@ -1,8 +1,11 @@
 import streamlit as st
 import os
 import sys
+import time
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-from services.chatbot_service import ChatbotService
+from services.session_manager import SessionManager
+from core.telemetry import telemetry, start_metrics_server
+from config import Config as cfg
 from pathlib import Path
 
 
@@ -26,10 +29,12 @@ def main():
     st.set_page_config(page_title="Chatbot NLP & LLM - UniSA", page_icon="🤖", layout="centered")
     st.title("💬 Chatbot NLP & LLM - University of Salerno")
     st.write("Ask anything about the NLP and Large Language Models course!")
+    start_metrics_server()  # No-op unless TELEMETRY_METRICS_PORT is set
 
-    # Initialize session state
-    if "chatbot" not in st.session_state:
-        st.session_state.chatbot = ChatbotService()
+    # Initialize session state: the browser session only keeps its ID, the conversation lives in the shared graph
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = None
+    st.session_state.session_id, chatbot = SessionManager().get_or_create(st.session_state.session_id)
     if "messages" not in st.session_state:
         st.session_state.messages = []
     if "sources" not in st.session_state:
@@ -49,15 +54,26 @@ def main():
         # Stream the chatbot's response
         with st.chat_message("assistant"):
             response_placeholder = st.empty()
-            full_response = ""
-            for message in st.session_state.chatbot.stream_message(user_input):
+            tokens = []  # Joined only when rendering
+            pending_chars = 0  # Characters received since the last render
+            last_render = time.perf_counter()
+            render_time = 0.0  # Time spent re-rendering the partial answer
+            for message in chatbot.stream_message(user_input):
                 if message['type'] != 'tool':
-                    token = message["content"]
-                    full_response += token
-                    response_placeholder.markdown(full_response + "▌")
+                    tokens.append(message["content"])
+                    pending_chars += len(message["content"])
+                    # Coalesce tokens: re-render on a time or size cadence instead of on every token
+                    now = time.perf_counter()
+                    if pending_chars >= cfg.STREAM_RENDER_MAX_CHARS or now - last_render >= cfg.STREAM_RENDER_INTERVAL:
+                        response_placeholder.markdown("".join(tokens) + "▌")
+                        last_render = time.perf_counter()
+                        render_time += last_render - now
+                        pending_chars = 0
                 if message["source_documents"]:
                     st.session_state.sources = message["source_documents"]
+            full_response = "".join(tokens)
             response_placeholder.markdown(full_response)
+            telemetry.observe("gui_render_seconds", render_time)
         st.session_state.messages.append({"role": "assistant", "content": full_response})
 
     # Display sources with icons and parsed metadata
@@ -67,11 +83,12 @@ def main():
             source_metadata = doc["source"]
             document_name = extract_document_name(source_metadata.get("source", "Unknown Document"))
 
-            # Display source with an icon and document name
-            with st.sidebar.expander(f"📄 {document_name}"):
-                display_source_metadata(source_metadata)
-                st.markdown("**Content:**")
-                st.markdown(doc["content"])
+            # Display source with an icon and document name; metadata and content are rendered only when opened
+            if st.sidebar.toggle(f"📄 {document_name}", key=f"source_{i}"):
+                with st.sidebar.container(border=True):
+                    display_source_metadata(source_metadata)
+                    st.markdown("**Content:**")
+                    st.markdown(doc["content"])
 
 
 if __name__ == "__main__":
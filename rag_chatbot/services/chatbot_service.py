@@ -1,45 +1,133 @@
 import sys
 import os
+import time
 import uuid
-import re
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-from core.chat_graph import ChatGraph
-from langchain_core.messages import SystemMessage, HumanMessage, RemoveMessage
+from core.chat_graph import ChatGraph, vector_store_manager
+from core.sources import to_source_records
+from core.telemetry import telemetry
+from services.response_cache import SemanticCache
+from config import Config as cfg
+from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage
+
+# Old turns are folded into the conversation summary in the background, after the answer has been returned
+history_folder = ThreadPoolExecutor(max_workers=cfg.HISTORY_FOLD_WORKERS, thread_name_prefix="history-fold")
+
+# Answers are shared across sessions: near-identical questions skip the whole graph
+semantic_cache = SemanticCache()
 
 # ==========================
 # ChatbotService: Exposes API for GUI
 # ==========================
 class ChatbotService:
-    def __init__(self):
+    def __init__(self, chat_graph=None, thread_id=None):
         """Initialize chatbot components."""
         # self.retriever = Retriever()
-        self.app = ChatGraph()
-        self.system_prompt = SystemMessage(
-        '''You are an assistant for question-answering tasks about the Natural Language Processing and Large Language Models course of
-        University of Salerno. Ask only question about this topic, use also the context (if available) retrieved from the documents to answer the question.
-        You must ONLY answer questions related to the course, recognizing out-of-context questions and responding with "I'm sorry, I'm not enabled to provide answers
-        on topics outside of the course."
-        Always retrieve information before answering if the query is about NLP and Large Language Models or the course. Don't retrieve
-        only if the query is not related to the course otherwise try to retrieve information.'''
-    )
-        self.thread_id = self._generate_thread_id()
+        # Sessions share one compiled graph and LLM client: each session only owns its thread_id
+        self.app = chat_graph if chat_graph is not None else ChatGraph.shared()
+        # The system prompt is added by the graph to every LLM call, so a new session needs no graph run
+        self.system_prompt = self.app.SYSTEM_PROMPT
+        self.thread_id = thread_id or self._generate_thread_id()
         
         # When we run the application, we pass in a configuration dict that specifies a thread_id. 
         # This ID is used to distinguish conversational threads (e.g., between different users).
         self.config = {"configurable": {"thread_id": self.thread_id}}
-
-        # Initialize conversation state with system prompt
-        self.app.graph.invoke({"messages": [self.system_prompt]}, self.config)
+        self._pending_fold = None # Background fold of the history started after the last turn
     
     def _generate_thread_id(self):
         """Generate a unique thread ID for each session."""
         return str(uuid.uuid4())
 
 
+    def _cache_lookup(self, user_input):
+        """
+        Look up the semantic cache.
+
+        Returns:
+            tuple: The cached entry (None on a miss) and the query embedding (None if the cache is not used)
+        """
+        if not cfg.SEMANTIC_CACHE:
+            return None, None
+        # Follow-up questions depend on the conversation, so only standalone questions are cached
+        if cfg.SEMANTIC_CACHE_FIRST_TURN_ONLY:
+            messages = self.app.graph.get_state(self.config).values.get("messages", [])
+            if any(message.type == "human" for message in messages):
+                return None, None
+        query_embedding = vector_store_manager.embeddings.embed_query(user_input)
+        return semantic_cache.lookup(query_embedding, version=vector_store_manager.build_id), query_embedding
+
+    def _cache_store(self, query_embedding, user_input, answer, source_documents):
+        if query_embedding is not None and answer:
+            semantic_cache.store(query_embedding, user_input, answer, source_documents, version=vector_store_manager.build_id)
+
+    @staticmethod
+    def _cached_turn(user_input, answer):
+        """State update adding a turn answered from the cache to the conversation, as if the graph had run."""
+        return {"messages": [HumanMessage(user_input), AIMessage(answer)]}
+
+    def _record_cached_turn(self, user_input, answer):
+        self.app.graph.update_state(self.config, self._cached_turn(user_input, answer), as_node="generate_response")
+
+    @staticmethod
+    def _cached_stream_items(cached):
+        """Stream items of a cached answer, in the same sequence as a graph run: the retrieval result, then the answer."""
+        metadata = {"langgraph_node": "semantic_cache"}
+        if cached["source_documents"]:
+            yield {"content": "", "metadata": metadata, "type": "tool", "source_documents": cached["source_documents"]}
+        yield {"content": cached["answer"], "metadata": metadata, "type": "ai", "source_documents": []}
+
+    def _start_fold(self):
+        self._pending_fold = history_folder.submit(self.app.fold_history, self.config)
+
+    def _astart_fold(self):
+        self._pending_fold = asyncio.create_task(self.app.afold_history(self.config))
+
+    @staticmethod
+    def _fold_failed(e):
+        # The turns stay in the history and are folded after a later turn
+        print(f"History summarization failed: {e}")
+
+    def _wait_for_fold(self):
+        """The next turn starts from the folded history: wait for a fold still running (usually finished already)."""
+        fold, self._pending_fold = self._pending_fold, None
+        if isinstance(fold, Future):
+            try:
+                fold.result()
+            except Exception as e:
+                self._fold_failed(e)
+
+    async def _await_fold(self):
+        fold, self._pending_fold = self._pending_fold, None
+        if fold is None:
+            return
+        try:
+            await (asyncio.wrap_future(fold) if isinstance(fold, Future) else fold)
+        except Exception as e:
+            self._fold_failed(e)
+
+    @staticmethod
+    def _no_response():
+        return {"content": "I'm sorry, I couldn't process your request.", "source_documents": [], "type": "ai"}
+
     def send_message(self, user_input: str, verbose=False):
         """Send a message to the chatbot and get a response."""
+        with telemetry.trace(), telemetry.span("response"):
+            self._wait_for_fold()
+            try:
+                return self._send_message(user_input, verbose)
+            finally:
+                self._start_fold()
+
+    def _send_message(self, user_input, verbose):
+        cached, query_embedding = self._cache_lookup(user_input)
+        if cached is not None:
+            self._record_cached_turn(user_input, cached["answer"])
+            return {"content": cached["answer"], "source_documents": cached["source_documents"], "type": "ai"}
+
         input_message = {"messages": [HumanMessage(user_input)]}
         
         # Initialize variables to store the response and source documents
@@ -52,94 +140,176 @@ class ChatbotService:
             
             # Check if this is a tool message (retrieval result)
             if response.type == "tool":
-                parsed_results = self._parse_retrieved_text(response.content)
-                source_documents = parsed_results
+                source_documents = to_source_records(response.artifact)
 
             if verbose:
                 response.pretty_print()
 
         if response:
+            if response.type == "ai":
+                self._cache_store(query_embedding, user_input, response.content, source_documents)
             # Return dictionary with response content, source documents, and message type
             return {
                 "content": response.content,
                 "source_documents": source_documents,
                 "type": response.type
             }
-        return {"content": "I'm sorry, I couldn't process your request.", "source_documents": [], "type": "ai"}
+        return self._no_response()
+
+    async def asend_message(self, user_input: str):
+        """Send a message to the chatbot and get a response, without blocking the event loop."""
+        with telemetry.trace(), telemetry.span("response"):
+            await self._await_fold()
+            try:
+                return await self._asend_message(user_input)
+            finally:
+                self._astart_fold()
+
+    async def _asend_message(self, user_input):
+        # The embedding of the cache lookup is CPU-bound: keep it off the event loop
+        cached, query_embedding = await asyncio.to_thread(self._cache_lookup, user_input)
+        if cached is not None:
+            await self.app.graph.aupdate_state(
+                self.config, self._cached_turn(user_input, cached["answer"]), as_node="generate_response"
+            )
+            return {"content": cached["answer"], "source_documents": cached["source_documents"], "type": "ai"}
+
+        response = None
+        source_documents = []
+        async for step in self.app.graph.astream({"messages": [HumanMessage(user_input)]}, config=self.config, stream_mode="values"):
+            response = step["messages"][-1]
+            if response.type == "tool":
+                source_documents = to_source_records(response.artifact)
+
+        if response:
+            if response.type == "ai":
+                self._cache_store(query_embedding, user_input, response.content, source_documents)
+            return {"content": response.content, "source_documents": source_documents, "type": response.type}
+        return self._no_response()
 
     
+    @staticmethod
+    def _stream_source(item):
+        return "cache" if item["metadata"].get("langgraph_node") == "semantic_cache" else "graph"
+
     def stream_message(self, user_input: str):
         """Stream the chatbot's response token by token."""
+        with telemetry.trace():
+            start = time.perf_counter()
+            self._wait_for_fold()
+            first_token = True
+            item = None
+            try:
+                for item in self._stream_items(user_input):
+                    if first_token and item["type"] != "tool" and item["content"]:
+                        telemetry.observe("time_to_first_token_seconds", time.perf_counter() - start, source=self._stream_source(item))
+                        first_token = False
+                    yield item
+            finally:
+                self._start_fold()
+            if item is not None:
+                telemetry.observe("stream_seconds", time.perf_counter() - start, source=self._stream_source(item))
+
+    def _stream_items(self, user_input):
+        cached, query_embedding = self._cache_lookup(user_input)
+        if cached is not None:
+            self._record_cached_turn(user_input, cached["answer"])
+            yield from self._cached_stream_items(cached)
+            return
+
         input_message = {"messages": [HumanMessage(user_input)]}
         
-        # Keep track of source documents
+        # Keep track of source documents and of the streamed answer
         source_documents = []
+        answer_tokens = []
         
         # Stream the response token by token
         for message, metadata in self.app.graph.stream(input_message, config=self.config, stream_mode="messages"):
             # Check if this is a tool message (retrieval result)
             if message.type == "tool":
-                parsed_results = self._parse_retrieved_text(message.content)
-                source_documents = parsed_results
+                source_documents = to_source_records(message.artifact)
+                answer_tokens = []  # Anything streamed before the retrieval is routing output
+            elif isinstance(message.content, str):
+                answer_tokens.append(message.content)
                 
             # Yield a dictionary with the content, metadata, type, and source documents
+            # The retrieved context is not part of the answer: tool items carry the sources only
             yield {
-                "content": message.content,
+                "content": "" if message.type == "tool" else message.content,
                 "metadata": metadata, 
                 "type": message.type,
                 "source_documents": source_documents if message.type == "tool" else []
             }
 
+        self._cache_store(query_embedding, user_input, "".join(answer_tokens), source_documents)
+
+    async def astream_message(self, user_input: str):
+        """Stream the chatbot's response token by token, without blocking the event loop."""
+        with telemetry.trace():
+            start = time.perf_counter()
+            await self._await_fold()
+            first_token = True
+            item = None
+            try:
+                async for item in self._astream_items(user_input):
+                    if first_token and item["type"] != "tool" and item["content"]:
+                        telemetry.observe("time_to_first_token_seconds", time.perf_counter() - start, source=self._stream_source(item))
+                        first_token = False
+                    yield item
+            finally:
+                self._astart_fold()
+            if item is not None:
+                telemetry.observe("stream_seconds", time.perf_counter() - start, source=self._stream_source(item))
+
+    async def _astream_items(self, user_input):
+        cached, query_embedding = await asyncio.to_thread(self._cache_lookup, user_input)
+        if cached is not None:
+            await self.app.graph.aupdate_state(
+                self.config, self._cached_turn(user_input, cached["answer"]), as_node="generate_response"
+            )
+            for item in self._cached_stream_items(cached):
+                yield item
+            return
+
+        source_documents = []
+        answer_tokens = []
+        async for message, metadata in self.app.graph.astream({"messages": [HumanMessage(user_input)]}, config=self.config, stream_mode="messages"):
+            if message.type == "tool":
+                source_documents = to_source_records(message.artifact)
+                answer_tokens = []  # Anything streamed before the retrieval is routing output
+            elif isinstance(message.content, str):
+                answer_tokens.append(message.content)
+            yield {
+                "content": "" if message.type == "tool" else message.content,
+                "metadata": metadata,
+                "type": message.type,
+                "source_documents": source_documents if message.type == "tool" else []
+            }
+
+        self._cache_store(query_embedding, user_input, "".join(answer_tokens), source_documents)
+
+    @staticmethod
+    def _reset_update(all_messages):
+        # The summary of the folded turns belongs to the conversation being reset
+        return {"messages": [RemoveMessage(id=m.id) for m in all_messages], "summary": ""}
+
     def reset_conversation(self):
         """Reset the conversation state."""
-        all_messages = self.app.graph.get_state(self.config).values["messages"]
-        self.app.graph.update_state(self.config, {"messages": [RemoveMessage(id=m.id) for m in all_messages if m.id != self.system_prompt.id]})
-    
-    @staticmethod
-    def _parse_retrieved_text(text):
-        """
-        Parse the formatted string with Source and Content sections into a list of dictionaries.
-        
-        Args:
-            text (str): The formatted string with Source and Content sections
-            
-        Returns:
-            list: A list of dictionaries, each containing source metadata and content
-        """
-        # Split the text into individual document entries
-        entries = re.split(r'(?=Source: )', text.strip())
-        
-        results = []
-        for entry in entries:
-            if not entry.strip():
-                continue
-                
-            # Extract source and content parts
-            source_match = re.search(r'Source: (\{.*?\})', entry)
-            content_match = re.search(r'Content: (.*?)(?=Source:|$)', entry, re.DOTALL)
-            
-            if source_match and content_match:
-                # Parse the source dictionary string
-                source_str = source_match.group(1)
-                try:
-                    # Convert string representation of dict to actual dict
-                    source_dict = eval(source_str)
-                except:
-                    # Fallback if eval fails
-                    source_dict = {"raw_source": source_str}
-                    
-                # Get the content
-                content = content_match.group(1).strip()
-                
-                # Create a dictionary for this entry
-                doc_dict = {
-                    "source": source_dict,
-                    "content": content
-                }
-                
-                results.append(doc_dict)
-        
-        return results
+        self._wait_for_fold()
+        values = self.app.graph.get_state(self.config).values
+        if values.get("messages") or values.get("summary"):
+            self.app.graph.update_state(
+                self.config, self._reset_update(values.get("messages", [])), as_node="generate_response"
+            )
+
+    async def areset_conversation(self):
+        """Reset the conversation state, without blocking the event loop."""
+        await self._await_fold()
+        values = (await self.app.graph.aget_state(self.config)).values
+        if values.get("messages") or values.get("summary"):
+            await self.app.graph.aupdate_state(
+                self.config, self._reset_update(values.get("messages", [])), as_node="generate_response"
+            )
 
 
 # ==========================
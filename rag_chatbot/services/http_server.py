@@ -0,0 +1,270 @@
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from core.chat_graph import vector_store_manager, APICallException
+from core.telemetry import telemetry
+from services.session_manager import SessionManager
+from config import Config as cfg
+
+# ==========================
+# Admission control
+# ==========================
+class Overloaded(Exception):
+    pass
+
+class AdmissionControl:
+    '''
+    Bounds the requests served concurrently. When all slots are busy, requests wait in a bounded queue for at most
+    queue_timeout seconds; beyond that they are rejected, so that a load balancer can retry elsewhere instead of
+    piling up latency here.'''
+
+    def __init__(self, max_active=cfg.HTTP_MAX_CONCURRENT_REQUESTS, max_queued=cfg.HTTP_MAX_QUEUED_REQUESTS,
+                 queue_timeout=cfg.HTTP_QUEUE_TIMEOUT):
+        self._semaphore = asyncio.Semaphore(max_active)
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.queued = 0
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed. Raises Overloaded if the queue is full or the wait times out."""
+        if self._semaphore.locked() and self.queued >= self.max_queued:
+            raise Overloaded()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded()
+        finally:
+            self.queued -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+# ==========================
+# Helpers
+# ==========================
+def _error(status, detail, headers=None):
+    return JSONResponse({"detail": detail}, status_code=status, headers=headers)
+
+def _sse(event, data):
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _read_message(request):
+    """User message from the JSON body ({"message": ...}) or from the "message" query parameter, None if not a string."""
+    if request.method == "GET":
+        return request.query_params.get("message")
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return None
+    message = body.get("message") if isinstance(body, dict) else None
+    return message if isinstance(message, str) else None
+
+async def _admit(request):
+    """
+    Reserve a slot and the session for one request.
+
+    Returns:
+        tuple: The ChatbotService of the session and None, or None and the error response
+    """
+    state = request.app.state
+    if not state.ready:
+        telemetry.increment("http_rejected_total", reason="not_ready")
+        return None, _error(503, "Warming up", headers={"Retry-After": "5"})
+    session_id = request.path_params["session_id"]
+    service = SessionManager().get(session_id)
+    if service is None:
+        return None, _error(404, "Session not found")
+    # Turns of the same session are sequential: the session is marked busy while its request waits in the queue too
+    if session_id in state.busy_sessions:
+        telemetry.increment("http_rejected_total", reason="session_busy")
+        return None, _error(409, "The session is already processing a message")
+    state.busy_sessions.add(session_id)
+    admitted = False
+    try:
+        await state.admission.acquire()
+        admitted = True
+    except Overloaded:
+        telemetry.increment("http_rejected_total", reason="overloaded")
+        return None, _error(503, "Too many requests", headers={"Retry-After": "1"})
+    finally:
+        # Also when the client disconnects while queued
+        if not admitted:
+            state.busy_sessions.discard(session_id)
+    request.state.admitted = True
+    return service, None
+
+def _release(request):
+    """Give back the slot and the session of an admitted request. Safe to call more than once."""
+    if getattr(request.state, "admitted", False):
+        request.state.admitted = False
+        request.app.state.busy_sessions.discard(request.path_params["session_id"])
+        request.app.state.admission.release()
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    '''
+    Streaming response that releases the admission of its request once sent, also when the client disconnects
+    before the body starts (the body generator would then never run, nor its cleanup).'''
+
+    def __init__(self, request, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.request = request
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            _release(self.request)
+
+# ==========================
+# Endpoints
+# ==========================
+async def create_session(request):
+    if not request.app.state.ready:
+        return _error(503, "Warming up", headers={"Retry-After": "5"})
+    session_id, _ = SessionManager().get_or_create()
+    return JSONResponse({"session_id": session_id}, status_code=201)
+
+async def close_session(request):
+    SessionManager().close(request.path_params["session_id"])
+    return Response(status_code=204)
+
+async def send_message(request):
+    message = await _read_message(request)
+    if not message:
+        return _error(400, 'Missing "message"')
+    service, error = await _admit(request)
+    if error is not None:
+        return error
+    try:
+        with telemetry.span("http_request", route="messages"):
+            return JSONResponse(await service.asend_message(message))
+    except APICallException as e:
+        # The language model could not be reached: the request itself was fine
+        return _error(502, str(e))
+    finally:
+        _release(request)
+
+async def stream_message(request):
+    """Stream the answer as Server-Sent Events: "sources", then one "token" event per token, then "done"."""
+    message = await _read_message(request)
+    if not message:
+        return _error(400, 'Missing "message"')
+    service, error = await _admit(request)
+    if error is not None:
+        return error
+
+    async def events():
+        try:
+            with telemetry.span("http_request", route="stream"):
+                async for item in service.astream_message(message):
+                    if item["source_documents"]:
+                        yield _sse("sources", item["source_documents"])
+                    elif item["type"] != "tool" and item["content"]:
+                        yield _sse("token", {"content": item["content"]})
+            yield _sse("done", {})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            # Free the slot as soon as the answer is complete
+            _release(request)
+
+    # The slot is held until the stream ends or the client disconnects
+    try:
+        return _AdmittedStreamingResponse(request, events(), media_type="text/event-stream",
+                                          headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    except BaseException:
+        _release(request)
+        raise
+
+async def reset_session(request):
+    service, error = await _admit(request)
+    if error is not None:
+        return error
+    try:
+        await service.areset_conversation()
+        return Response(status_code=204)
+    finally:
+        _release(request)
+
+async def healthz(request):
+    return PlainTextResponse("ok")
+
+async def readyz(request):
+    state = request.app.state
+    if state.ready:
+        return JSONResponse({"ready": True, "warmup_seconds": state.warmup_seconds})
+    return JSONResponse({"ready": False}, status_code=503)
+
+async def metrics(request):
+    return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+# ==========================
+# Application
+# ==========================
+def warm_up():
+    """Load the graph, the LLM client, the vector store(s), the embedding model and the reranker before serving."""
+    SessionManager()
+    vector_store_manager.search("warm-up")
+
+def create_app():
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        app.state.ready = False
+        app.state.warmup_seconds = None
+        app.state.admission = AdmissionControl()
+        app.state.busy_sessions = set()
+
+        async def warm():
+            # The server answers liveness probes during the warm-up and reports ready only after it
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(warm_up)
+            except Exception as e:
+                print(f"Warm-up failed, the server will not report ready: {e}")
+                return
+            app.state.warmup_seconds = time.perf_counter() - start
+            telemetry.observe("warmup_seconds", app.state.warmup_seconds)
+            app.state.ready = True
+            print(f"Warm-up completed in {app.state.warmup_seconds:.2f}s. Ready to serve.")
+
+        task = asyncio.create_task(warm())
+        yield
+        task.cancel()
+
+    return Starlette(
+        routes=[
+            Route("/sessions", create_session, methods=["POST"]),
+            Route("/sessions/{session_id}", close_session, methods=["DELETE"]),
+            Route("/sessions/{session_id}/messages", send_message, methods=["POST"]),
+            Route("/sessions/{session_id}/stream", stream_message, methods=["GET", "POST"]),
+            Route("/sessions/{session_id}/reset", reset_session, methods=["POST"]),
+            Route("/healthz", healthz),
+            Route("/readyz", readyz),
+            Route("/metrics", metrics),
+        ],
+        lifespan=lifespan,
+    )
+
+def run(host=cfg.HTTP_HOST, port=cfg.HTTP_PORT):
+    import uvicorn
+    # One process: every session shares the graph, the LLM client and the vector store loaded in it
+    uvicorn.run(create_app(), host=host, port=port, workers=1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless HTTP server of the chatbot.")
+    parser.add_argument("--host", default=cfg.HTTP_HOST)
+    parser.add_argument("--port", type=int, default=cfg.HTTP_PORT)
+    args = parser.parse_args()
+    run(args.host, args.port)
@@ -0,0 +1,101 @@
+import sys
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from config import Config as cfg
+from core.telemetry import telemetry
+
+class SemanticCache:
+    '''
+    Answer cache keyed by the query embedding: a query whose cosine similarity with a cached query is above the
+    threshold gets the stored answer and sources without running the graph.
+    Entries expire after a TTL, the least recently used are evicted beyond max_entries, and the whole cache is
+    invalidated when the vector store build changes.'''
+
+    def __init__(self, threshold=cfg.SEMANTIC_CACHE_THRESHOLD, ttl=cfg.SEMANTIC_CACHE_TTL, max_entries=cfg.SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # entry ID -> entry, least recently used first
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self, version):
+        """Drop every entry when the vector store was rebuilt. Must be called with the lock held."""
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def _expire(self, now):
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry["created"] > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        self.evictions += len(expired)
+
+    def _count_miss(self):
+        self.misses += 1
+        telemetry.increment("semantic_cache_total", result="miss")
+
+    def lookup(self, query_embedding, version=None):
+        """
+        Return the cached entry most similar to the query if it is above the threshold, None otherwise.
+
+        Args:
+            query_embedding (list): Normalized embedding of the query
+            version (str): Build ID of the vector store the answers must come from
+        """
+        with self._lock:
+            self._check_version(version)
+            self._expire(time.time())
+            if not self._entries:
+                self._count_miss()
+                return None
+            entry_ids = list(self._entries)
+            matrix = np.array([self._entries[entry_id]["embedding"] for entry_id in entry_ids])
+            similarities = matrix @ np.asarray(query_embedding, dtype=np.float32)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self._count_miss()
+                return None
+            self.hits += 1
+            telemetry.increment("semantic_cache_total", result="hit")
+            self._entries.move_to_end(entry_ids[best])
+            return self._entries[entry_ids[best]]
+
+    def store(self, query_embedding, query, answer, source_documents, version=None):
+        with self._lock:
+            self._check_version(version)
+            self._entries[uuid.uuid4().hex] = {
+                "embedding": np.asarray(query_embedding, dtype=np.float32),
+                "query": query,
+                "answer": answer,
+                "source_documents": source_documents,
+                "created": time.time(),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the hit-rate metrics of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,125 @@
+import sys
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from core.chat_graph import ChatGraph
+from core.checkpointer import CompactSQLiteSaver
+from services.chatbot_service import ChatbotService
+from config import Config as cfg
+
+# ==========================
+# SessionManager: Process-wide registry of user sessions
+# ==========================
+class SessionManager:
+    '''
+    Singleton class that manages the user sessions of the process.
+    Every session shares the same compiled graph and LLM client and only owns a thread_id; sessions idle for
+    longer than SESSION_TTL, or beyond MAX_SESSIONS (least recently used first), are evicted with their state.
+    Sessions whose conversation was persisted by a previous process are reattached on their first request, and
+    persisted conversations idle for longer than SESSION_TTL are deleted.'''
+    _instance = None # instance of the class
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(SessionManager, cls).__new__(cls)
+                cls._instance._initialized = False  # Flag to check if the class has been initialized
+        return cls._instance
+
+    def __init__(self, chat_graph=None, ttl=cfg.SESSION_TTL, max_sessions=cfg.MAX_SESSIONS):
+        if not self._initialized:
+            self.chat_graph = chat_graph if chat_graph is not None else ChatGraph.shared()
+            self.ttl = ttl
+            self.max_sessions = max_sessions
+            self._sessions = OrderedDict()  # session ID -> (ChatbotService, last access), least recently used first
+            self._lock = threading.Lock()
+            self.evictions = 0
+            self._next_sweep = 0.0 # Time of the next sweep of the persisted conversations
+            self._initialized = True  # Set the flag to True
+
+    def get_or_create(self, session_id=None):
+        """
+        Return the session with the given ID, creating it if it does not exist (or was evicted).
+
+        Returns:
+            tuple: The session ID and its ChatbotService
+        """
+        with self._lock:
+            now = time.time()
+            self._evict_expired(now)
+            if session_id in self._sessions:
+                service, _ = self._sessions[session_id]
+                self._sessions[session_id] = (service, now)
+                self._sessions.move_to_end(session_id)
+                return session_id, service
+
+            service = self._add(session_id, now)
+            return service.thread_id, service
+
+    def get(self, session_id):
+        """Return the ChatbotService of an active or persisted session, or None."""
+        with self._lock:
+            now = time.time()
+            self._evict_expired(now)
+            if session_id not in self._sessions:
+                # After a restart, the conversation of the session is still in the checkpointer
+                if self.chat_graph.memory.get_tuple({"configurable": {"thread_id": session_id}}) is None:
+                    return None
+                return self._add(session_id, now)
+            service, _ = self._sessions[session_id]
+            self._sessions[session_id] = (service, now)
+            self._sessions.move_to_end(session_id)
+            return service
+
+    def _add(self, session_id, now):
+        """Register a session, evicting the least recently used ones beyond the limit. Must be called with the lock held."""
+        service = ChatbotService(chat_graph=self.chat_graph, thread_id=session_id)
+        self._sessions[service.thread_id] = (service, now)
+        while len(self._sessions) > self.max_sessions:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            self._delete_state(evicted_id)
+            self.evictions += 1
+        return service
+
+    def close(self, session_id):
+        """End a session and delete its conversation state."""
+        with self._lock:
+            # Also a persisted session that was not reattached
+            self._sessions.pop(session_id, None)
+            self._delete_state(session_id)
+
+    def _evict_expired(self, now):
+        """Evict the sessions idle for longer than the TTL. Must be called with the lock held."""
+        expired = [session_id for session_id, (_, last_access) in self._sessions.items() if now - last_access > self.ttl]
+        for session_id in expired:
+            del self._sessions[session_id]
+            self._delete_state(session_id)
+        self.evictions += len(expired)
+        if now >= self._next_sweep and isinstance(self.chat_graph.memory, CompactSQLiteSaver):
+            # Conversations left by previous processes expire like the sessions of this one
+            self.chat_graph.memory.delete_threads_before(now - self.ttl, keep=self._sessions)
+            self._next_sweep = now + self.ttl
+
+    def _delete_state(self, session_id):
+        self.chat_graph.memory.delete_thread(session_id)
+
+    def stats(self):
+        """Return the number of active sessions and the approximate size of their conversation state."""
+        with self._lock:
+            self._evict_expired(time.time())
+            services = [service for service, _ in self._sessions.values()]
+        # Serialized size of the latest checkpoint, as a proxy of the memory held by each session
+        sizes = [len(pickle.dumps(service.app.graph.get_state(service.config).values)) for service in services]
+        return {
+            "active_sessions": len(services),
+            "evictions": self.evictions,
+            "state_bytes_total": sum(sizes),
+            "state_bytes_per_session": sum(sizes) / len(sizes) if sizes else 0,
+            "state_bytes_max": max(sizes, default=0),
+        }
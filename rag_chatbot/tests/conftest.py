@@ -0,0 +1,21 @@
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.offline_benchmark import configure_offline
+
+# The core modules read the configuration at import: point it to a scratch directory and the fake embeddings first
+WORKDIR = tempfile.mkdtemp(prefix="rag_tests_")
+configure_offline(WORKDIR, 64)
+
+from benchmarks.fakes import HashingEmbeddings
+from core.vector_store import VectorStoreManager
+
+# The manager is a singleton: create it with the fake embeddings before the graph module does
+VectorStoreManager(embeddings=HashingEmbeddings(64))
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
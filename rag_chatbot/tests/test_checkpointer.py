@@ -0,0 +1,117 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import time
+import sqlite3
+import asyncio
+from langgraph.checkpoint.base import empty_checkpoint, create_checkpoint
+from core.checkpointer import CompactSQLiteSaver
+
+def _config(thread_id, checkpoint_id=None):
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+def _put(saver, thread_id, checkpoint, parent_id=None, step=0):
+    return saver.put(_config(thread_id, parent_id), checkpoint, {"source": "loop", "step": step}, {})
+
+def test_put_get_round_trip(tmp_path):
+    saver = CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"summary": "earlier turns"}
+    config = _put(saver, "thread", checkpoint)
+
+    stored = saver.get_tuple(_config("thread"))
+    assert stored.config == config
+    assert stored.checkpoint["id"] == checkpoint["id"]
+    assert stored.checkpoint["channel_values"] == {"summary": "earlier turns"}
+    assert stored.metadata == {"source": "loop", "step": 0}
+    assert stored.parent_config is None
+    assert saver.get_tuple(_config("other")) is None
+
+def test_put_writes_are_returned_as_pending(tmp_path):
+    saver = CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")
+    config = _put(saver, "thread", empty_checkpoint())
+    saver.put_writes(config, [("messages", ["hello"]), ("summary", "")], task_id="task")
+
+    stored = saver.get_tuple(_config("thread"))
+    assert sorted(stored.pending_writes) == [("task", "messages", ["hello"]), ("task", "summary", "")]
+
+def test_new_checkpoint_compacts_the_previous_ones(tmp_path):
+    saver = CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")
+    first = empty_checkpoint()
+    first_config = _put(saver, "thread", first)
+    saver.put_writes(first_config, [("messages", ["hello"])], task_id="task")
+    second = create_checkpoint(first, None, 1)
+    second_config = _put(saver, "thread", second, parent_id=first["id"], step=1)
+
+    stored = saver.get_tuple(_config("thread"))
+    assert stored.config == second_config
+    assert stored.parent_config == _config("thread", first["id"])
+    assert stored.pending_writes == []
+    assert saver.get_tuple(_config("thread", first["id"])) is None
+    assert [checkpoint.config for checkpoint in saver.list(_config("thread"))] == [second_config]
+
+def test_delete_thread(tmp_path):
+    saver = CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")
+    config = _put(saver, "thread", empty_checkpoint())
+    saver.put_writes(config, [("messages", ["hello"])], task_id="task")
+    _put(saver, "other", empty_checkpoint())
+
+    saver.delete_thread("thread")
+    assert saver.get_tuple(_config("thread")) is None
+    assert saver.get_tuple(_config("other")) is not None
+
+def test_delete_threads_before(tmp_path):
+    saver = CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")
+    for thread_id in ("old", "kept", "recent"):
+        config = _put(saver, thread_id, empty_checkpoint())
+        saver.put_writes(config, [("messages", ["hello"])], task_id="task")
+    cutoff = time.time()
+    _put(saver, "recent", empty_checkpoint())
+
+    assert saver.delete_threads_before(cutoff, keep={"kept"}) == ["old"]
+    assert saver.get_tuple(_config("old")) is None
+    assert saver.get_tuple(_config("kept")) is not None
+    assert saver.get_tuple(_config("recent")) is not None
+    with sqlite3.connect(tmp_path / "checkpoints.sqlite") as connection:
+        assert connection.execute("SELECT COUNT(*) FROM writes WHERE thread_id = 'old'").fetchone() == (0,)
+
+def test_database_without_update_times_is_migrated(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    _put(CompactSQLiteSaver(path), "thread", empty_checkpoint())
+    with sqlite3.connect(path) as connection:
+        connection.execute("ALTER TABLE checkpoints DROP COLUMN updated_at")
+
+    saver = CompactSQLiteSaver(path)
+    # The threads of the old database count as updated when it is opened
+    assert saver.delete_threads_before(time.time() - 60) == []
+    assert saver.get_tuple(_config("thread")) is not None
+    _put(saver, "other", empty_checkpoint())
+    assert saver.get_tuple(_config("other")) is not None
+
+def test_checkpoints_survive_reopening(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    checkpoint = empty_checkpoint()
+    _put(CompactSQLiteSaver(path), "thread", checkpoint)
+    assert CompactSQLiteSaver(path).get_tuple(_config("thread")).checkpoint["id"] == checkpoint["id"]
+
+def test_async_api(tmp_path):
+    saver = CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")
+
+    async def round_trip():
+        checkpoint = empty_checkpoint()
+        config = await saver.aput(_config("thread"), checkpoint, {"step": 0}, {})
+        await saver.aput_writes(config, [("messages", ["hello"])], task_id="task")
+        stored = await saver.aget_tuple(_config("thread"))
+        listed = [checkpoint async for checkpoint in saver.alist(_config("thread"))]
+        await saver.adelete_thread("thread")
+        return stored, listed, await saver.aget_tuple(_config("thread"))
+
+    stored, listed, deleted = asyncio.run(round_trip())
+    assert stored.pending_writes == [("task", "messages", ["hello"])]
+    assert len(listed) == 1
+    assert deleted is None
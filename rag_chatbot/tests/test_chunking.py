@@ -0,0 +1,53 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.documents import Document
+from core.chunking import Deduplicator, merge_short_pages, simhash, strip_boilerplate
+
+TEXT = ("The transformer replaces recurrence with self-attention, so every token attends to every other token "
+        "of the sequence and the layers can be computed in parallel on modern hardware.")
+
+def _pages(*bodies):
+    return [
+        Document(page_content=f"NLP course - University of Salerno\n{body}\nPage {i + 1} of {len(bodies)}",
+                 metadata={"source": "slides.pdf", "page": i})
+        for i, body in enumerate(bodies)
+    ]
+
+def test_strip_boilerplate_removes_repeated_headers_and_footers():
+    pages = _pages("Tokenization", "Word embeddings", "Attention", "Transformers")
+    cleaned, removed = strip_boilerplate(pages, edge_lines=2, min_fraction=0.5)
+    assert removed == 8
+    assert [doc.page_content for doc in cleaned] == ["Tokenization", "Word embeddings", "Attention", "Transformers"]
+    assert cleaned[2].metadata == {"source": "slides.pdf", "page": 2}
+
+def test_strip_boilerplate_needs_three_pages():
+    pages = _pages("Tokenization", "Word embeddings")
+    assert strip_boilerplate(pages, edge_lines=2, min_fraction=0.5) == (pages, 0)
+
+def test_merge_short_pages_within_a_chunk():
+    pages = [Document(page_content=text, metadata={"page": i}) for i, text in enumerate(["aaaa", "", "bbbb", "cccccccc"])]
+    merged = merge_short_pages(pages, chunk_size=12)
+    assert [doc.page_content for doc in merged] == ["aaaa\n\nbbbb", "cccccccc"]
+    assert merged[0].metadata == {"page": 0, "last_page": 2}
+
+def test_simhash_of_near_duplicates_differs_in_few_bits():
+    near = TEXT.replace("modern hardware", "modern GPUs")
+    other = "Byte pair encoding builds a subword vocabulary by merging the most frequent pairs of symbols."
+    assert bin(simhash(TEXT) ^ simhash(near)).count("1") <= 12
+    assert bin(simhash(TEXT) ^ simhash(other)).count("1") > 12
+
+def test_deduplicator_drops_exact_and_near_duplicates():
+    deduplicator = Deduplicator(max_distance=12)
+    assert not deduplicator.is_duplicate(TEXT)
+    assert deduplicator.is_duplicate("  " + TEXT.upper())
+    assert deduplicator.is_duplicate(TEXT.replace("modern hardware", "modern GPUs"))
+    assert not deduplicator.is_duplicate("Byte pair encoding merges the most frequent pairs of symbols into subwords.")
+
+def test_deduplicator_without_near_duplicate_detection():
+    deduplicator = Deduplicator(max_distance=None)
+    assert not deduplicator.is_duplicate(TEXT)
+    assert deduplicator.is_duplicate(TEXT)
+    assert not deduplicator.is_duplicate(TEXT.replace("modern hardware", "modern GPUs"))
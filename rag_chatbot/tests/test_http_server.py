@@ -0,0 +1,87 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncio
+import pytest
+from starlette.testclient import TestClient
+from benchmarks.fakes import FakeChatModel
+from core.chat_graph import ChatGraph
+from services import http_server
+from services.session_manager import SessionManager
+
+class UnavailableChatModel(FakeChatModel):
+    '''Chat model whose provider is down.'''
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        raise RuntimeError("provider unavailable")
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        raise RuntimeError("provider unavailable")
+
+def _client(llm_client, max_active=4, max_queued=4):
+    """Client of a ready app, without the warm-up of its lifespan."""
+    SessionManager._instance = None
+    SessionManager(chat_graph=ChatGraph(llm_client=llm_client))
+    app = http_server.create_app()
+    app.state.ready = True
+    app.state.admission = http_server.AdmissionControl(max_active=max_active, max_queued=max_queued, queue_timeout=1)
+    app.state.busy_sessions = set()
+    return TestClient(app)
+
+@pytest.fixture(autouse=True)
+def reset_session_manager():
+    yield
+    SessionManager._instance = None
+
+def test_message_must_be_a_non_empty_string():
+    client = _client(FakeChatModel(latency=0))
+    session_id = client.post("/sessions").json()["session_id"]
+    for body in ({"message": 123}, {"message": ["hello"]}, {"message": ""}, {}, ["hello"]):
+        response = client.post(f"/sessions/{session_id}/messages", json=body)
+        assert response.status_code == 400, body
+    assert client.app.state.busy_sessions == set()
+
+def test_language_model_failure_is_a_bad_gateway():
+    client = _client(UnavailableChatModel(latency=0))
+    session_id = client.post("/sessions").json()["session_id"]
+    response = client.post(f"/sessions/{session_id}/messages", json={"message": "Hello!"})
+    assert response.status_code == 502
+    assert "language model" in response.json()["detail"]
+    # The slot and the session are given back
+    assert client.app.state.busy_sessions == set()
+    assert client.app.state.admission.queued == 0
+
+def test_admission_queues_then_rejects():
+    async def scenario():
+        admission = http_server.AdmissionControl(max_active=1, max_queued=1, queue_timeout=0.2)
+        await admission.acquire()
+        queued = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0.01)
+        assert admission.queued == 1
+        # The queue is full: rejected without waiting
+        with pytest.raises(http_server.Overloaded):
+            await admission.acquire()
+        admission.release()
+        await queued
+        # The slot is taken again: a new request waits for the timeout, then is rejected
+        with pytest.raises(http_server.Overloaded):
+            await admission.acquire()
+        assert admission.queued == 0
+
+    asyncio.run(scenario())
+
+def test_busy_session_and_saturated_server_are_rejected():
+    client = _client(FakeChatModel(latency=0), max_active=1, max_queued=0)
+    session_id = client.post("/sessions").json()["session_id"]
+    other_id = client.post("/sessions").json()["session_id"]
+    client.app.state.busy_sessions.add(session_id)
+    assert client.post(f"/sessions/{session_id}/messages", json={"message": "Hello!"}).status_code == 409
+
+    client.app.state.busy_sessions.clear()
+    asyncio.run(client.app.state.admission.acquire())
+    response = client.post(f"/sessions/{other_id}/messages", json={"message": "Hello!"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.app.state.busy_sessions == set()
@@ -0,0 +1,28 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.documents import Document
+from benchmarks.fakes import HashingEmbeddings
+from core.reranker import Reranker, estimate_tokens
+from core.sources import format_context
+
+def _docs(*texts):
+    return [Document(page_content=text, metadata={"source": f"slides_{i}.pdf", "page": i}) for i, text in enumerate(texts)]
+
+def test_rerank_keeps_the_best_documents_within_the_budget():
+    docs = _docs("attention " * 40, "attention heads " * 400, "attention layers " * 30)
+    embeddings = HashingEmbeddings(64)
+    budget = estimate_tokens(docs[0].page_content) + estimate_tokens(docs[2].page_content)
+
+    kept = Reranker(embeddings).rerank("attention", embeddings.embed_query("attention"), docs, k=3, token_budget=budget,
+                                       rank_relevance=True)
+    # The oversized second candidate is skipped, the next one still fits
+    assert kept == [docs[0], docs[2]]
+
+def test_context_includes_every_kept_document():
+    docs = _docs("attention " * 400, "transformer " * 400)
+    context = format_context(docs)
+    assert context.count("slides_") == 2
+    assert "slides_1.pdf, page 2" in context
@@ -0,0 +1,54 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from core.telemetry import telemetry
+from services.response_cache import SemanticCache
+
+def _unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_hits_and_misses_reach_telemetry():
+    telemetry.reset()
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.lookup(_unit(1, 0))
+    cache.store(_unit(1, 0), "query", "answer", [])
+    cache.lookup(_unit(1, 0.1))
+    cache.lookup(_unit(0, 1))
+
+    counters = telemetry.snapshot()["counters"]
+    assert counters["semantic_cache_total{result=hit}"] == 1
+    assert counters["semantic_cache_total{result=miss}"] == 2
+    assert 'semantic_cache_total{result="hit"} 1' in telemetry.render_prometheus()
+
+def test_similar_query_gets_the_cached_answer():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.store(_unit(1, 0, 0), "What is BPE?", "Byte pair encoding.", [{"source": {}, "content": "BPE"}], version="v1")
+    entry = cache.lookup(_unit(1, 0.2, 0), version="v1")
+    assert entry["answer"] == "Byte pair encoding."
+    assert cache.lookup(_unit(0, 1, 0), version="v1") is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+def test_rebuilt_vector_store_invalidates_the_cache():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.store(_unit(1, 0), "query", "answer", [], version="v1")
+    assert cache.lookup(_unit(1, 0), version="v2") is None
+    assert cache.stats()["entries"] == 0
+
+def test_entries_expire_and_least_recently_used_are_evicted():
+    cache = SemanticCache(threshold=0.99, ttl=60, max_entries=2)
+    cache.store(_unit(1, 0, 0), "first", "1", [])
+    cache.store(_unit(0, 1, 0), "second", "2", [])
+    assert cache.lookup(_unit(1, 0, 0))["answer"] == "1"
+    cache.store(_unit(0, 0, 1), "third", "3", [])
+    # "second" was the least recently used
+    assert cache.lookup(_unit(0, 1, 0)) is None
+    assert cache.lookup(_unit(1, 0, 0))["answer"] == "1"
+
+    expired = SemanticCache(threshold=0.99, ttl=0, max_entries=2)
+    expired.store(_unit(1, 0), "query", "answer", [])
+    assert expired.lookup(_unit(1, 0)) is None
+    assert expired.stats()["evictions"] == 1
@@ -0,0 +1,77 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import time
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from core.checkpointer import CompactSQLiteSaver
+from services.session_manager import SessionManager
+
+class StubGraph:
+    '''Only the parts of ChatGraph that the session manager and the sessions use without running a turn.'''
+    SYSTEM_PROMPT = "system"
+
+    def __init__(self, memory):
+        self.memory = memory
+
+@pytest.fixture
+def new_manager():
+    """Create a fresh SessionManager (a singleton) for every call, as a new process would."""
+    def create(graph, **kwargs):
+        SessionManager._instance = None
+        return SessionManager(chat_graph=graph, **kwargs)
+    yield create
+    SessionManager._instance = None
+
+def _save_conversation(memory, thread_id):
+    memory.put({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}, empty_checkpoint(), {}, {})
+
+def test_persisted_session_is_reattached_after_a_restart(tmp_path, new_manager):
+    path = tmp_path / "checkpoints.sqlite"
+    session_id, _ = new_manager(StubGraph(CompactSQLiteSaver(path))).get_or_create()
+    _save_conversation(SessionManager().chat_graph.memory, session_id)
+
+    manager = new_manager(StubGraph(CompactSQLiteSaver(path)))
+    service = manager.get(session_id)
+    assert service is not None and service.thread_id == session_id
+    assert manager.get(session_id) is service
+    assert manager.get("unknown") is None
+
+def test_expired_persisted_sessions_are_deleted(tmp_path, new_manager):
+    path = tmp_path / "checkpoints.sqlite"
+    _save_conversation(CompactSQLiteSaver(path), "old")
+    time.sleep(0.05)
+
+    manager = new_manager(StubGraph(CompactSQLiteSaver(path)), ttl=0.01)
+    assert manager.get("old") is None
+    assert manager.chat_graph.memory.get_tuple({"configurable": {"thread_id": "old"}}) is None
+
+def test_least_recently_used_sessions_are_evicted_with_their_state(tmp_path, new_manager):
+    manager = new_manager(StubGraph(CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")), ttl=60, max_sessions=2)
+    first, _ = manager.get_or_create()
+    second, _ = manager.get_or_create()
+    for session_id in (first, second):
+        _save_conversation(manager.chat_graph.memory, session_id)
+    manager.get(first)
+    third, _ = manager.get_or_create()
+
+    assert manager.get(second) is None
+    assert manager.chat_graph.memory.get_tuple({"configurable": {"thread_id": second}}) is None
+    assert manager.get(first) is not None and manager.get(third) is not None
+    assert manager.evictions == 1
+
+def test_idle_sessions_expire(tmp_path, new_manager):
+    manager = new_manager(StubGraph(CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")), ttl=0.01)
+    session_id, _ = manager.get_or_create()
+    time.sleep(0.05)
+    assert manager.get(session_id) is None
+    assert manager.evictions == 1
+
+def test_close_deletes_the_conversation(tmp_path, new_manager):
+    manager = new_manager(StubGraph(CompactSQLiteSaver(tmp_path / "checkpoints.sqlite")))
+    session_id, _ = manager.get_or_create()
+    _save_conversation(manager.chat_graph.memory, session_id)
+    manager.close(session_id)
+    assert manager.get(session_id) is None
@@ -0,0 +1,46 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from core.sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+def _index():
+    index = BM25Index(k1=1.5, b=0.75)
+    index.add("bpe", "Byte pair encoding (BPE) merges the most frequent pair of symbols.")
+    index.add("attention", "Self-attention weighs every token of the sequence.")
+    index.add("rnn", "Recurrent networks process the sequence one token at a time.")
+    return index
+
+def test_tokenize_keeps_exact_terms():
+    assert tokenize("The BPE of GPT-2") == ["the", "bpe", "of", "gpt", "2"]
+
+def test_bm25_ranks_exact_term_matches():
+    index = _index()
+    assert [chunk_id for chunk_id, _ in index.search("what is BPE?", 3)] == ["bpe"]
+    ranking = index.search("attention sequence", 3)
+    assert ranking[0][0] == "attention"
+    assert {chunk_id for chunk_id, _ in ranking} == {"attention", "rnn"}
+    assert index.search("convolution", 3) == []
+
+def test_bm25_remove_and_round_trip(tmp_path):
+    index = _index()
+    index.remove("bpe")
+    assert len(index) == 2
+    assert index.search("BPE", 3) == []
+    assert "bpe" not in index.postings and "merges" not in index.postings
+
+    index.save(tmp_path / "sparse_index.json")
+    loaded = BM25Index.load(tmp_path / "sparse_index.json")
+    assert loaded.search("token sequence", 3) == index.search("token sequence", 3)
+
+def test_rrf_favours_chunks_ranked_well_by_both():
+    dense = ["a", "b", "c"]
+    sparse = ["b", "d", "a"]
+    assert reciprocal_rank_fusion([dense, sparse], [0.5, 0.5], k=60) == ["b", "a", "d", "c"]
+
+def test_rrf_weights():
+    dense = ["a", "b"]
+    sparse = ["b", "a"]
+    assert reciprocal_rank_fusion([dense, sparse], [0.8, 0.2], k=60) == ["a", "b"]
+    assert reciprocal_rank_fusion([dense, sparse], [0.2, 0.8], k=60) == ["b", "a"]
@@ -0,0 +1,62 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import threading
+from benchmarks.fakes import HashingEmbeddings
+from core.speculative import SpeculativeRetrieval
+
+class CountingRetriever:
+    '''Retriever returning the query as its only document, counting the searches.'''
+
+    def __init__(self):
+        self.embeddings = HashingEmbeddings(64)
+        self.searches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def search(self, query, k, timings):
+        self.release.wait(5)
+        self.searches.append(query)
+        timings["dense_search_ms"] = 1.0
+        return [query]
+
+def test_same_query_reuses_the_speculative_result():
+    retriever = CountingRetriever()
+    speculative = SpeculativeRetrieval(retriever, max_workers=2, similarity=0.9, ttl=60)
+    speculative.start("What is BPE?")
+    docs, timings = speculative.take("What is BPE?", "what is  bpe?")
+    assert docs == ["What is BPE?"]
+    assert timings == {"dense_search_ms": 1.0}
+    assert retriever.searches == ["What is BPE?"]
+    assert speculative.take("What is BPE?", "What is BPE?") is None
+
+def test_sessions_asking_the_same_question_share_one_search():
+    retriever = CountingRetriever()
+    retriever.release.clear()
+    speculative = SpeculativeRetrieval(retriever, max_workers=2, similarity=0.9, ttl=60)
+    speculative.start("What is a transformer?")
+    speculative.start("what is a TRANSFORMER?")
+    retriever.release.set()
+    assert speculative.take("What is a transformer?", "What is a transformer?")[0] == ["What is a transformer?"]
+    assert speculative.take("what is a TRANSFORMER?", "what is a transformer?")[0] == ["What is a transformer?"]
+    assert len(retriever.searches) == 1
+
+def test_different_tool_query_is_not_reused():
+    retriever = CountingRetriever()
+    speculative = SpeculativeRetrieval(retriever, max_workers=2, similarity=0.9, ttl=60)
+    speculative.start("Who is the professor of the course?")
+    assert speculative.take("Who is the professor of the course?", "byte pair encoding merges") is None
+
+def test_discarded_speculation_is_cancelled():
+    retriever = CountingRetriever()
+    retriever.release.clear()
+    speculative = SpeculativeRetrieval(retriever, max_workers=1, similarity=0.9, ttl=60)
+    speculative.start("Hello!")
+    speculative.start("Thanks!")  # Queued behind the first search
+    speculative.discard("Thanks!")
+    retriever.release.set()
+    assert speculative.take("Hello!", "Hello!")[0] == ["Hello!"]
+    speculative._executor.shutdown(wait=True)
+    assert retriever.searches == ["Hello!"]